@@ -3,4 +3,6 @@ from .models import *
 
 admin.site.register(SmartMeter)
 admin.site.register(RealTimeMeter)
-admin.site.register(ThirtyMinAvg)
\ No newline at end of file
+admin.site.register(ThirtyMinAvg)
+admin.site.register(MeterRollup)
+admin.site.register(PollStats)
\ No newline at end of file
@@ -0,0 +1,133 @@
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+import pytz
+
+"""
+Columnar archive of raw RealTimeMeter samples, written by the retention pruner before
+rows are deleted. Samples are stored per smart meter and UTC day as one flat binary file
+per column (<archive dir>/<smart meter id>/<YYYY-MM-DD>/<column>.bin, dtypes in COLUMNS),
+so a batch is archived by appending to a handful of files. Readers memory-map the files
+and binary search the timestamp column, so only the pages covering the requested range
+are read from disk. Day files are kept sorted by timestamp; an append that starts before
+the end of a day rewrites that day in order. Rows archived twice (pruner interrupted between archive and delete)
+are dropped by the reader.
+"""
+
+# Archived columns and their on-disk dtypes (little endian, no header)
+COLUMNS = {
+    "timestamp": np.dtype("<M8[us]"),  # UTC
+    "active": np.dtype("<f8"),
+    "reactive": np.dtype("<f8"),
+    "apparent": np.dtype("<f8"),
+    "power_factor": np.dtype("<f8"),
+    "freq": np.dtype("<f8"),
+}
+
+
+def _day_dir(archive_dir, sm_id, day: datetime.date) -> str:
+    return os.path.join(str(archive_dir), str(sm_id), day.isoformat())
+
+
+# Naive UTC datetime64 of an aware or (UTC) naive datetime
+def _to_datetime64(timestamp: datetime.datetime) -> np.datetime64:
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(pytz.utc).replace(tzinfo=None)
+    return np.datetime64(timestamp, "us")
+
+
+# Append rows of (smart_meter_id, timestamp, active, reactive, apparent, power_factor, freq)
+# to the archive; rows should be in insertion (id) order. Returns number of rows archived
+def archive_rows(rows, archive_dir) -> int:
+    if not rows:
+        return 0
+    sm_ids = np.array([row[0] for row in rows])
+    columns = {
+        "timestamp": np.array([_to_datetime64(row[1]) for row in rows]),
+    }
+    for i, name in enumerate(list(COLUMNS)[1:], start=2):
+        columns[name] = np.array(
+            [np.nan if row[i] is None else row[i] for row in rows], dtype=COLUMNS[name]
+        )
+    days = columns["timestamp"].astype("M8[D]")
+
+    # one group of appends per (smart meter, day); stable sort keeps id order inside a group
+    order = np.lexsort((days.astype(np.int64), sm_ids))
+    keys = np.stack([sm_ids[order], days[order].astype(np.int64)], axis=1)
+    starts = np.flatnonzero(np.any(np.diff(keys, axis=0) != 0, axis=1)) + 1
+    for group in np.split(order, starts):
+        group = group[np.argsort(columns["timestamp"][group], kind="stable")]
+        sm_id = sm_ids[group[0]]
+        day = days[group[0]].astype(datetime.date)
+        path = _day_dir(archive_dir, sm_id, day)
+        os.makedirs(path, exist_ok=True)
+        _append_day(path, {name: values[group] for name, values in columns.items()})
+    return len(rows)
+
+
+# Append sorted columns to a day; the day is rewritten in order if they start before its end
+def _append_day(path, columns: dict):
+    existing = _map_column(path, "timestamp")
+    if existing is None or existing[-1] <= columns["timestamp"][0]:
+        for name, values in columns.items():
+            with open(os.path.join(path, f"{name}.bin"), "ab") as f:
+                values.astype(COLUMNS[name]).tofile(f)
+        return
+
+    length = len(existing)
+    merged = {}
+    for name, values in columns.items():
+        old = _map_column(path, name)
+        old = np.full(length, np.nan) if old is None else np.array(old[:length])
+        merged[name] = np.concatenate([old, values.astype(COLUMNS[name])])
+    del existing
+    order = np.argsort(merged["timestamp"], kind="stable")
+    for name, values in merged.items():
+        values[order].tofile(os.path.join(path, f"{name}.bin"))
+
+
+# Memory-map one column file; None if missing or empty
+def _map_column(path, name):
+    file = os.path.join(path, f"{name}.bin")
+    if not os.path.exists(file) or os.path.getsize(file) == 0:
+        return None
+    return np.memmap(file, dtype=COLUMNS[name], mode="r")
+
+
+# Archived samples of a smart meter in [start, end) as a DataFrame indexed by UTC timestamp
+# Only the requested columns (default all) and the pages covering the range are read
+def read_archive(smart_meter_id, start, end, archive_dir, columns=None) -> pd.DataFrame:
+    columns = list(COLUMNS)[1:] if columns is None else list(columns)
+    start64, end64 = _to_datetime64(start), _to_datetime64(end)
+
+    parts = {name: [] for name in ["timestamp"] + columns}
+    day = start64.astype("M8[D]")
+    while day <= end64.astype("M8[D]"):
+        path = _day_dir(archive_dir, smart_meter_id, day.astype(datetime.date))
+        day += 1
+        timestamps = _map_column(path, "timestamp")
+        if timestamps is None:
+            continue
+        # files that lost a trailing append are cut to their common length
+        mapped = {name: _map_column(path, name) for name in columns}
+        lengths = [len(values) for values in mapped.values() if values is not None]
+        length = min([len(timestamps)] + lengths)
+        timestamps = timestamps[:length]
+        # rows are appended in id order, so each day file is sorted by timestamp
+        lo, hi = np.searchsorted(timestamps, [start64, end64])
+        parts["timestamp"].append(np.array(timestamps[lo:hi]))
+        for name, values in mapped.items():
+            part = np.full(hi - lo, np.nan) if values is None else values[lo:hi]
+            parts[name].append(np.array(part))
+
+    if not parts["timestamp"]:
+        index = pd.DatetimeIndex([], tz=pytz.utc, name="timestamp")
+        return pd.DataFrame({name: [] for name in columns}, index=index, dtype=float)
+
+    timestamps = np.concatenate(parts["timestamp"])
+    timestamps, first = np.unique(timestamps, return_index=True)
+    data = {name: np.concatenate(parts[name])[first] for name in columns}
+    index = pd.DatetimeIndex(timestamps, name="timestamp").tz_localize(pytz.utc)
+    return pd.DataFrame(data, index=index)
@@ -0,0 +1,149 @@
+import csv
+import datetime
+import itertools
+
+import pandas as pd
+import pyarrow
+import pyarrow.parquet
+import pytz
+from django.conf import settings
+from django.db import models
+
+from data_collection.archive import read_archive
+from data_collection.models import RealTimeMeter, ThirtyMinAvg
+
+"""
+Bulk export of meter history (ThirtyMinAvg, or raw RealTimeMeter samples) for offline
+analysis, used by metrics.export_history and the export_meter_history command. Rows are
+read in keyset chunks of EXPORT_CHUNK_SIZE on (smart_meter, timestamp, id) with
+values_list, so memory stays flat for any range: QuerySet.iterator() alone does not
+stream on MySQL, where the driver buffers the whole result set. Pruned raw samples are
+read from the archive when it is enabled, one day at a time. Rows are written as CSV
+(streamed, or to a file) or as Parquet row groups.
+"""
+
+EXPORT_MODELS = {"thirty_min": ThirtyMinAvg, "raw": RealTimeMeter}
+
+
+def _numeric_fields(model) -> list:
+    return [
+        field.name
+        for field in model._meta.get_fields()
+        if isinstance(field, (models.FloatField, models.PositiveIntegerField))
+    ]
+
+
+# Fields that can be exported per source
+EXPORT_FIELDS = {source: _numeric_fields(model) for source, model in EXPORT_MODELS.items()}
+EXPORT_FORMATS = ["csv", "parquet"]
+
+
+# Aware datetime of an ISO date or datetime; naive values are taken as UTC
+def parse_time(value: str) -> datetime.datetime:
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize("UTC")
+    return timestamp.to_pydatetime()
+
+
+# Rows (smart_meter_id, timestamp, id, *fields) after the keyset position `after`, in key
+# order. id breaks ties between rows of a meter with the same timestamp, which would
+# otherwise be skipped at a chunk boundary
+def rows_after(model, sm_ids, start, end, fields, after, limit) -> list:
+    rows = model.objects.filter(
+        smart_meter_id__in=sm_ids, timestamp__gte=start, timestamp__lt=end
+    )
+    if after is not None:
+        sm_id, timestamp, pk = after
+        rows = rows.filter(
+            models.Q(smart_meter_id__gt=sm_id)
+            | models.Q(smart_meter_id=sm_id, timestamp__gt=timestamp)
+            | models.Q(smart_meter_id=sm_id, timestamp=timestamp, id__gt=pk)
+        )
+    rows = rows.order_by("smart_meter_id", "timestamp", "id")
+    return list(rows.values_list("smart_meter_id", "timestamp", "id", *fields)[:limit])
+
+
+# Every row of the given meters in [start, end), read in keyset chunks
+def iter_rows(model, sm_ids, start, end, fields, chunk_size=None):
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    after = None
+    while True:
+        chunk = rows_after(model, sm_ids, start, end, fields, after, chunk_size)
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        after = chunk[-1][:3]
+
+
+# Archived rows (timestamp, *fields) of one meter in [start, end), read one UTC day at a time
+def _iter_archive(sm_id, start, end, fields):
+    day_start = start
+    while day_start < end:
+        next_day = day_start.astimezone(pytz.utc).date() + datetime.timedelta(days=1)
+        day_end = min(end, datetime.datetime.combine(next_day, datetime.time(), pytz.utc))
+        frame = read_archive(sm_id, day_start, day_end, settings.RT_ARCHIVE_DIR, fields)
+        for timestamp, *values in frame.itertuples(name=None):
+            yield (timestamp.to_pydatetime(), *[None if v != v else v for v in values])
+        day_start = day_end
+
+
+# Rows (meter name, timestamp, *fields) of the smart meters in [start, end), meter by
+# meter in timestamp order. Raw samples older than the stored ones come from the archive
+def export_rows(source, smart_meters, start, end, fields, chunk_size=None):
+    model = EXPORT_MODELS[source]
+    for sm in smart_meters:
+        if source == "raw" and settings.RT_ARCHIVE_ENABLED:
+            first = model.objects.filter(smart_meter=sm).aggregate(
+                first=models.Min("timestamp")
+            )["first"]
+            archived_end = end if first is None else min(end, first)
+            for row in _iter_archive(sm.pk, start, archived_end, fields):
+                yield (sm.field_name, *row)
+        for _, timestamp, _, *values in iter_rows(
+            model, [sm.pk], start, end, fields, chunk_size
+        ):
+            yield (sm.field_name, timestamp, *values)
+
+
+class _Echo:
+    # file-like object for csv.writer that returns the line instead of storing it
+    def write(self, value):
+        return value
+
+
+# CSV text of export rows with a header, yielded in blocks of chunk_size lines
+def iter_csv(rows, fields, chunk_size=None):
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    writer = csv.writer(_Echo())
+    yield writer.writerow(["meter", "timestamp"] + list(fields))
+    rows = iter(rows)
+    while chunk := list(itertools.islice(rows, chunk_size)):
+        yield "".join(
+            writer.writerow([name, timestamp.isoformat(), *values])
+            for name, timestamp, *values in chunk
+        )
+
+
+# Write export rows to a Parquet file, one row group per chunk; returns the rows written
+def write_parquet(rows, fields, path, chunk_size=None) -> int:
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    schema = pyarrow.schema(
+        [("meter", pyarrow.string()), ("timestamp", pyarrow.timestamp("us", tz="UTC"))]
+        + [(field, pyarrow.float64()) for field in fields]
+    )
+    written = 0
+    rows = iter(rows)
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        while chunk := list(itertools.islice(rows, chunk_size)):
+            names, timestamps, *values = zip(*chunk)
+            columns = [names, timestamps] + [
+                [None if v is None else float(v) for v in column] for column in values
+            ]
+            arrays = [
+                pyarrow.array(column, type=schema.field(i).type)
+                for i, column in enumerate(columns)
+            ]
+            writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+            written += len(chunk)
+    return written
@@ -0,0 +1,131 @@
+import datetime
+import statistics
+import time
+
+import pytz
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from data_collection.models import RealTimeMeter, SmartMeter
+
+"""
+Benchmark of the RealTimeMeter queries that depend on the (smart_meter, timestamp) and
+timestamp indexes: a 30 minute window for one meter, latest() for one meter and the
+retention scan over all meters. Each table size is timed with and without the indexes.
+Runs against a throwaway test database (test_<NAME>) so real data is never touched;
+the configured DB user needs permission to create it.
+Start with: python manage.py bench_window_queries [--sizes 10000 100000] [--meters 20]
+"""
+
+SAMPLE_INTERVAL = datetime.timedelta(seconds=10)
+INSERT_BATCH = 5000
+
+
+class Command(BaseCommand):
+    help = "Time RealTimeMeter window queries with and without timestamp indexes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[10_000, 100_000, 500_000],
+            help="RealTimeMeter table sizes to benchmark",
+        )
+        parser.add_argument(
+            "--meters", type=int, default=20, help="Smart meters the rows are spread over"
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=20, help="Runs per query (median is reported)"
+        )
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self._run(options["sizes"], options["meters"], options["repeat"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _run(self, sizes, num_meters, repeat):
+        meters = [
+            SmartMeter.objects.create(
+                field_name=f"Bench SM {i}",
+                ip_address=f"10.0.0.{i}",
+                latitude=34.0,
+                longitude=-118.0,
+                modbus_port=502,
+            )
+            for i in range(num_meters)
+        ]
+        end = datetime.datetime(2024, 1, 1, tzinfo=pytz.utc)
+        self.stdout.write(
+            f"{'rows':>10} {'indexes':>8} {'window ms':>10} {'latest ms':>10} {'retention ms':>13}"
+        )
+        stored = 0
+        for size in sorted(sizes):
+            # Extend the table backwards in time so the newest rows stay the same
+            self._populate(meters, end, stored, size)
+            stored = size
+            for indexed in (True, False):
+                if not indexed:
+                    self._set_indexes(False)
+                window, latest, retention = self._time_queries(meters[0], end, repeat)
+                if not indexed:
+                    self._set_indexes(True)
+                self.stdout.write(
+                    f"{size:>10} {'yes' if indexed else 'no':>8} "
+                    f"{window:>10.3f} {latest:>10.3f} {retention:>13.3f}"
+                )
+
+    def _populate(self, meters, end, start_index, stop_index):
+        batch = []
+        for n in range(start_index, stop_index):
+            sm = meters[n % len(meters)]
+            batch.append(
+                RealTimeMeter(
+                    smart_meter=sm,
+                    timestamp=end - SAMPLE_INTERVAL * (n // len(meters)),
+                    active=1.0,
+                    reactive=1.0,
+                    apparent=1.0,
+                    power_factor=1.0,
+                    freq=60.0,
+                )
+            )
+            if len(batch) == INSERT_BATCH:
+                RealTimeMeter.objects.bulk_create(batch)
+                batch = []
+        RealTimeMeter.objects.bulk_create(batch)
+        if connection.vendor in ("sqlite", "postgresql"):
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+    def _set_indexes(self, enabled: bool):
+        with connection.schema_editor() as editor:
+            for index in RealTimeMeter._meta.indexes:
+                if enabled:
+                    editor.add_index(RealTimeMeter, index)
+                else:
+                    editor.remove_index(RealTimeMeter, index)
+
+    # Median milliseconds of the window, latest and retention queries
+    def _time_queries(self, sm, end, repeat) -> tuple:
+        window_start = end - datetime.timedelta(minutes=30)
+        cutoff = end - datetime.timedelta(minutes=120)
+        queries = (
+            lambda: list(
+                RealTimeMeter.objects.filter(smart_meter=sm, timestamp__gte=window_start)
+            ),
+            lambda: RealTimeMeter.objects.filter(smart_meter=sm).latest("timestamp"),
+            lambda: RealTimeMeter.objects.filter(timestamp__lt=cutoff).count(),
+        )
+        medians = []
+        for query in queries:
+            runs = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                query()
+                runs.append((time.perf_counter() - start) * 1000)
+            medians.append(statistics.median(runs))
+        return tuple(medians)
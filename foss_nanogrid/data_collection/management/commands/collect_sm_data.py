@@ -0,0 +1,71 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from data_collection.modbus_poller import get_connection_pool, get_event_loop
+from data_collection.tasks import _get_all_sm_data
+
+log = logging.getLogger(__name__)
+
+"""
+Long-running smart meter collector; an alternative to the 10 second celery beat task.
+Sweeps run in-process on a monotonic schedule (tick n starts at t0 + n * interval) so
+there is no broker latency or drift and sub-second intervals are possible. Sweeps use
+the same SmartMeter configuration and storage as data_collection.tasks.get_all_sm_data.
+If a sweep overruns, the missed ticks are skipped rather than run back to back.
+Start with: python manage.py collect_sm_data [--interval SECONDS]
+"""
+
+
+class Command(BaseCommand):
+    help = "Poll all smart meters in-process on a fixed schedule"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.SM_POLL_INTERVAL,
+            help="Seconds between the start of two sweeps",
+        )
+        parser.add_argument(
+            "--sweeps",
+            type=int,
+            default=None,
+            help="Stop after this many sweeps (runs forever by default)",
+        )
+
+    def handle(self, *args, **options):
+        interval = options["interval"]
+        sweeps = options["sweeps"]
+        if interval <= 0:
+            self.stderr.write("Interval must be greater than 0")
+            return
+
+        log.info(f"Collecting smart meter data every {interval}s")
+        next_tick = time.monotonic()
+        done = 0
+        try:
+            while sweeps is None or done < sweeps:
+                close_old_connections()
+                try:
+                    _get_all_sm_data()
+                except Exception as e:
+                    log.error(f"Smart meter sweep failed: {e}")
+                done += 1
+
+                next_tick += interval
+                now = time.monotonic()
+                if now > next_tick:
+                    missed = int((now - next_tick) // interval) + 1
+                    log.warning(f"Sweep overran schedule; skipping {missed} tick(s)")
+                    next_tick += missed * interval
+                if sweeps is None or done < sweeps:
+                    time.sleep(next_tick - now)
+        except KeyboardInterrupt:
+            log.info("Stopping smart meter collector")
+        finally:
+            get_connection_pool().close()
+            get_event_loop().close()
@@ -0,0 +1,64 @@
+import time
+
+"""
+Per-meter circuit breaker for the poller. A meter that fails FAILURE_THRESHOLD sweeps
+in a row is considered offline (circuit open) and is skipped by normal sweeps; it is
+only probed again on an exponential backoff schedule (PROBE_BASE doubling up to
+PROBE_MAX seconds). A successful probe closes the circuit and the meter returns to
+the normal cadence. Healthy meters are polled every sweep. State lives in memory
+of the polling process, next to the Modbus connection pool, so sweeps must all run in
+one process: the collect_sm_data command, or the single-process Celery worker of
+SM_POLL_QUEUE_NAME (see run_foss_nanogrid_webapp.zsh).
+"""
+
+
+class MeterHealth:
+    FAILURE_THRESHOLD = 3  # consecutive failed sweeps before the circuit opens
+    PROBE_BASE = 30.0  # seconds
+    PROBE_MAX = 900.0  # seconds
+
+    def __init__(self):
+        self.failures = 0
+        self.probe_at = 0.0  # time.monotonic() of the next probe while open
+
+    @property
+    def circuit_open(self) -> bool:
+        return self.failures >= self.FAILURE_THRESHOLD
+
+    def should_poll(self, now: float) -> bool:
+        return not self.circuit_open or now >= self.probe_at
+
+    def record_success(self):
+        self.failures = 0
+        self.probe_at = 0.0
+
+    def record_failure(self, now: float):
+        self.failures += 1
+        if self.circuit_open:
+            exponent = self.failures - self.FAILURE_THRESHOLD
+            self.probe_at = now + min(self.PROBE_MAX, self.PROBE_BASE * 2**exponent)
+
+
+class MeterHealthRegistry:
+    def __init__(self):
+        self._health = {}
+
+    def __getitem__(self, sm_pk) -> MeterHealth:
+        return self._health.setdefault(sm_pk, MeterHealth())
+
+    # Return the meters that are due to be polled this sweep
+    def due(self, smart_meters, now: float = None) -> list:
+        now = time.monotonic() if now is None else now
+        return [sm for sm in smart_meters if self[sm.pk].should_poll(now)]
+
+    # Update health from poll results: list of (smart meter, values or None)
+    def record(self, results, regs=5, now: float = None):
+        now = time.monotonic() if now is None else now
+        for sm, vals in results:
+            if vals is not None and len(vals) == regs:
+                self[sm.pk].record_success()
+            else:
+                self[sm.pk].record_failure(now)
+
+    def offline(self) -> list:
+        return [pk for pk, health in self._health.items() if health.circuit_open]
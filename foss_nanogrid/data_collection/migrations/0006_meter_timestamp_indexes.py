@@ -0,0 +1,29 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_collection', '0005_rename_connected_smartmeter_recieving_info'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='realtimemeter',
+            index=models.Index(fields=['smart_meter', 'timestamp'], name='real_time_meter_sm_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='realtimemeter',
+            index=models.Index(fields=['timestamp'], name='real_time_meter_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='thirtyminavg',
+            index=models.Index(fields=['smart_meter', 'timestamp'], name='thirty_min_avg_sm_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='thirtyminavg',
+            index=models.Index(fields=['timestamp'], name='thirty_min_avg_time_idx'),
+        ),
+    ]
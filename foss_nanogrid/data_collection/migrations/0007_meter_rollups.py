@@ -0,0 +1,52 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_collection', '0006_meter_timestamp_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MeterRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.PositiveIntegerField(choices=[(1, '1 minute'), (30, '30 minutes'), (1440, '1 day')])),
+                ('bucket_start', models.DateTimeField()),
+                ('data_points', models.PositiveIntegerField(default=0)),
+                ('active_sum', models.FloatField(default=0)),
+                ('active_count', models.PositiveIntegerField(default=0)),
+                ('active_min', models.FloatField(blank=True, null=True)),
+                ('active_max', models.FloatField(blank=True, null=True)),
+                ('reactive_sum', models.FloatField(default=0)),
+                ('reactive_count', models.PositiveIntegerField(default=0)),
+                ('reactive_min', models.FloatField(blank=True, null=True)),
+                ('reactive_max', models.FloatField(blank=True, null=True)),
+                ('apparent_sum', models.FloatField(default=0)),
+                ('apparent_count', models.PositiveIntegerField(default=0)),
+                ('apparent_min', models.FloatField(blank=True, null=True)),
+                ('apparent_max', models.FloatField(blank=True, null=True)),
+                ('power_factor_sum', models.FloatField(default=0)),
+                ('power_factor_count', models.PositiveIntegerField(default=0)),
+                ('power_factor_min', models.FloatField(blank=True, null=True)),
+                ('power_factor_max', models.FloatField(blank=True, null=True)),
+                ('freq_sum', models.FloatField(default=0)),
+                ('freq_count', models.PositiveIntegerField(default=0)),
+                ('freq_min', models.FloatField(blank=True, null=True)),
+                ('freq_max', models.FloatField(blank=True, null=True)),
+                ('smart_meter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='data_collection.smartmeter')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='meterrollup',
+            index=models.Index(fields=['resolution', 'bucket_start'], name='meter_rollup_res_time_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='meterrollup',
+            constraint=models.UniqueConstraint(fields=('smart_meter', 'resolution', 'bucket_start'), name='unique_meter_rollup_bucket'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_collection', '0007_meter_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PollStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('successes', models.PositiveIntegerField(default=0)),
+                ('smart_meter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='data_collection.smartmeter')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bucket_start'], name='poll_stats_time_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='pollstats',
+            constraint=models.UniqueConstraint(fields=('smart_meter', 'bucket_start'), name='unique_poll_stats_bucket'),
+        ),
+    ]
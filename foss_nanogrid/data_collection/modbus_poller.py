@@ -0,0 +1,177 @@
+import asyncio
+import logging
+
+from pymodbus.client import AsyncModbusTcpClient
+from pymodbus.exceptions import ConnectionException, ModbusException
+
+from data_collection.meter_health import MeterHealthRegistry
+from data_collection.modbus_pool import ModbusConnectionPool
+from data_collection.register_planner import (
+    MAX_REGISTER_GAP,
+    extract_block_registers,
+    plan_register_reads,
+    split_block,
+)
+from data_collection.smart_meter_reciever import SmartMeterReciever
+
+log = logging.getLogger(__name__)
+
+"""
+Asyncio poll engine for smart meters. Every meter in a sweep is read concurrently
+(bounded by max_concurrency) so a sweep takes roughly as long as the slowest meter
+instead of the sum of all meters. Registers are fetched in the block reads planned
+by data_collection.register_planner. Only Modbus I/O happens here; the ORM is not async
+safe, so results are handed back to the caller (data_collection.tasks) for storage.
+Sweeps run on one event loop per process so pooled connections outlive a sweep;
+the pool and the meter health are per process, so all sweeps have to run in the same one.
+Meters whose circuit is open (see data_collection.meter_health) are left out of a
+sweep until their next probe is due. A meter that answers a merged block read with an
+error (typically an illegal address for an unmapped register in a gap) has that block
+re-read as single values; if those succeed, the split is remembered for the meter.
+"""
+
+# Default cap on the number of meters being read at the same time
+MAX_CONCURRENCY = 32
+
+_loop = None
+_pool = None
+_health = None
+# (ip_address, modbus_port, secondary_id) -> {(start, count)} of blocks read value by value
+_split_blocks = {}
+
+
+# Process-wide event loop; created lazily so forked (celery) workers each get their own
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+    return _loop
+
+
+# Process-wide Modbus connection pool shared by every sweep
+def get_connection_pool() -> ModbusConnectionPool:
+    global _pool
+    if _pool is None:
+        _pool = ModbusConnectionPool(timeout=SmartMeterReciever.TIMEOUT)
+    return _pool
+
+
+# Process-wide per-meter health (circuit breaker) state
+def get_meter_health() -> MeterHealthRegistry:
+    global _health
+    if _health is None:
+        _health = MeterHealthRegistry()
+    return _health
+
+
+# Read one block; returns {address index: registers}, or None on an error response
+async def _read_block(client: AsyncModbusTcpClient, block, secondary_id) -> dict | None:
+    response = await client.read_holding_registers(
+        block.start, count=block.count, slave=secondary_id
+    )
+    if response.isError():
+        log.debug(f"Reg. error at {block.start} (+{block.count}): {response}")
+        return None
+    return extract_block_registers(block, response.registers)
+
+
+# Read the planned register blocks from a connected client
+# split: (start, count) of the blocks this meter only answers value by value; blocks
+# that fail merged but succeed split are added to it
+# Returns the raw registers of every value in address order, or None if any read failed
+async def _read_sm_registers(
+    client: AsyncModbusTcpClient, plan: list, secondary_id=1, split: set = None
+) -> list | None:
+    split = set() if split is None else split
+    registers = {}
+    for block in plan:
+        key = (block.start, block.count)
+        values = None
+        if key not in split:
+            values = await _read_block(client, block, secondary_id)
+            if values is None and len(block.values) == 1:
+                return None
+        if values is None:
+            values = {}
+            for single in split_block(block):
+                single_values = await _read_block(client, single, secondary_id)
+                if single_values is None:
+                    return None
+                values.update(single_values)
+            if key not in split:
+                log.info(
+                    f"Reading registers {block.start} (+{block.count}) value by value "
+                    f"for secondary id {secondary_id}"
+                )
+                split.add(key)
+        registers.update(values)
+    return [reg for i in sorted(registers) for reg in registers[i]]
+
+
+# Poll a single smart meter; returns (smart meter, raw registers or None on failure)
+async def _poll_sm(
+    sm, semaphore: asyncio.Semaphore, pool: ModbusConnectionPool, plan: list
+) -> tuple:
+    async with semaphore:
+        log.debug("Reading Smart Meter " + sm.field_name + " ...")
+        try:
+            async with pool.connection(sm.ip_address, sm.modbus_port) as client:
+                registers = await _read_sm_registers(
+                    client,
+                    plan,
+                    secondary_id=sm.secondary_id,
+                    split=_split_blocks.setdefault(
+                        (sm.ip_address, sm.modbus_port, sm.secondary_id), set()
+                    ),
+                )
+        except ConnectionException:
+            log.info(f"Failed to connect to SM: {sm.field_name}")
+            return sm, None
+        except (ModbusException, asyncio.TimeoutError) as exc:
+            log.error(f"Received Modbus Exception: {exc}")
+            return sm, None
+
+    return sm, registers
+
+
+# Poll all given smart meters concurrently; returns list of (smart meter, values or None)
+async def poll_smart_meters(
+    smart_meters,
+    source_address=SmartMeterReciever.SOURCE_ADDRESS,
+    max_concurrency: int = MAX_CONCURRENCY,
+    max_gap: int = MAX_REGISTER_GAP,
+    pool: ModbusConnectionPool = None,
+) -> list:
+    pool = pool if pool is not None else get_connection_pool()
+    plan = plan_register_reads(source_address, max_gap=max_gap)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    raw = await asyncio.gather(
+        *(_poll_sm(sm, semaphore, pool, plan) for sm in smart_meters)
+    )
+
+    # Decode the registers of every meter that answered in one vectorized pass
+    answered = [registers for _, registers in raw if registers is not None]
+    decoded = iter(
+        SmartMeterReciever.conv_to_32bitfloats(answered).tolist() if answered else []
+    )
+    return [
+        (sm, next(decoded) if registers is not None else None) for sm, registers in raw
+    ]
+
+
+# Run one poll sweep on the process-wide event loop (call from sync code)
+# Only meters due according to their health are polled; results cover just those meters
+def run_sweep(
+    smart_meters,
+    max_concurrency: int = MAX_CONCURRENCY,
+    max_gap: int = MAX_REGISTER_GAP,
+) -> list:
+    health = get_meter_health()
+    due = health.due(smart_meters)
+    if len(due) < len(smart_meters):
+        log.debug(f"Skipping {len(smart_meters) - len(due)} offline smart meters")
+    results = get_event_loop().run_until_complete(
+        poll_smart_meters(due, max_concurrency=max_concurrency, max_gap=max_gap)
+    )
+    health.record(results, regs=len(SmartMeterReciever.SOURCE_ADDRESS))
+    return results
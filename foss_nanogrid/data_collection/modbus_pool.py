@@ -0,0 +1,104 @@
+import asyncio
+import contextlib
+import logging
+import random
+import time
+
+from pymodbus.client import AsyncModbusTcpClient
+from pymodbus.exceptions import ConnectionException, ModbusException
+
+log = logging.getLogger(__name__)
+
+"""
+Long-lived pool of Modbus TCP connections keyed by (ip_address, modbus_port). Sockets
+are reused between poll sweeps so steady-state polls only pay for register reads.
+A connection that drops or fails a request is closed and reopened on a later sweep,
+waiting a jittered exponential backoff between failed attempts so that unreachable
+gateways are not hammered with handshakes. Meters sharing a gateway share its
+connection; requests over one connection are serialized.
+Must be used from a single event loop (see modbus_poller.get_event_loop) in a single
+process: sockets and backoff state are not shared between processes, so Celery polls go
+to the single-process worker of SM_POLL_QUEUE_NAME (see run_foss_nanogrid_webapp.zsh).
+"""
+
+
+class _PooledConnection:
+    def __init__(self):
+        self.client = None
+        self.lock = asyncio.Lock()
+        self.failures = 0
+        self.retry_at = 0.0  # time.monotonic() before which no reconnect is attempted
+
+
+class ModbusConnectionPool:
+    BACKOFF_BASE = 1.0  # seconds
+    BACKOFF_MAX = 60.0  # seconds
+
+    def __init__(self, timeout, backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX):
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._connections = {}
+
+    def __len__(self):
+        return len(self._connections)
+
+    # Exponential backoff with jitter in [delay / 2, delay]
+    def _backoff(self, failures: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (failures - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _mark_broken(self, conn: _PooledConnection, host, port):
+        if conn.client is not None:
+            conn.client.close()
+            conn.client = None
+        conn.failures += 1
+        conn.retry_at = time.monotonic() + self._backoff(conn.failures)
+        log.debug(
+            f"Modbus connection {host}:{port} broken ({conn.failures} failures); "
+            f"retrying in {conn.retry_at - time.monotonic():.1f}s"
+        )
+
+    # Return a connected client for conn, reconnecting if it is due; None while backing off
+    async def _ensure_connected(self, conn: _PooledConnection, host, port):
+        if conn.client is not None and conn.client.connected:
+            return conn.client
+        if time.monotonic() < conn.retry_at:
+            return None
+
+        if conn.client is not None:
+            conn.client.close()
+        conn.client = AsyncModbusTcpClient(
+            host=host, port=port, timeout=self.timeout, reconnect_delay=0
+        )
+        try:
+            await conn.client.connect()
+        except (OSError, asyncio.TimeoutError) as exc:
+            log.debug(f"Connect to {host}:{port} raised {exc}")
+        if not conn.client.connected:
+            self._mark_broken(conn, host, port)
+            return None
+
+        conn.failures = 0
+        return conn.client
+
+    # Yield a connected client for (host, port); raises ConnectionException if unavailable
+    @contextlib.asynccontextmanager
+    async def connection(self, host, port):
+        conn = self._connections.setdefault((host, port), _PooledConnection())
+        async with conn.lock:
+            client = await self._ensure_connected(conn, host, port)
+            if client is None:
+                raise ConnectionException(f"No connection to {host}:{port}")
+            try:
+                yield client
+            except (ModbusException, asyncio.TimeoutError):
+                self._mark_broken(conn, host, port)
+                raise
+
+    def close(self):
+        for conn in self._connections.values():
+            if conn.client is not None:
+                conn.client.close()
+                conn.client = None
+        self._connections.clear()
@@ -57,6 +57,14 @@ class ThirtyMinAvg(models.Model):
 
     data_points = models.PositiveIntegerField(blank=False, null=False, default=0)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["smart_meter", "timestamp"], name="thirty_min_avg_sm_time_idx"
+            ),
+            models.Index(fields=["timestamp"], name="thirty_min_avg_time_idx"),
+        ]
+
     def __str__(self):
         return f"30 Min Avg - {self.smart_meter.field_name} at {self.timestamp}"
 
@@ -70,5 +78,93 @@ class RealTimeMeter(models.Model):
     power_factor = models.FloatField(blank=True, null=True)
     freq = models.FloatField(blank=True, null=True)
 
+    # (smart_meter, timestamp) serves per-meter windows and latest(); timestamp serves retention
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["smart_meter", "timestamp"], name="real_time_meter_sm_time_idx"
+            ),
+            models.Index(fields=["timestamp"], name="real_time_meter_time_idx"),
+        ]
+
     def __str__(self):
         return f"Real Time - {self.smart_meter.field_name} at {self.timestamp}"
+
+
+# Count, sum, min and max of real time data per smart meter and UTC aligned bucket at several
+# resolutions. The minute tier is upserted on ingest; each coarser tier is built once from
+# the tier below it (see data_collection.rollups), never from RealTimeMeter.
+class MeterRollup(models.Model):
+    class Resolution(models.IntegerChoices):
+        MINUTE = 1, "1 minute"
+        THIRTY_MIN = 30, "30 minutes"
+        DAY = 1440, "1 day"
+
+    smart_meter = models.ForeignKey(SmartMeter, on_delete=models.CASCADE)
+    resolution = models.PositiveIntegerField(choices=Resolution.choices)  # minutes
+    bucket_start = models.DateTimeField()
+    data_points = models.PositiveIntegerField(default=0)
+    active_sum = models.FloatField(default=0)
+    active_count = models.PositiveIntegerField(default=0)
+    active_min = models.FloatField(blank=True, null=True)
+    active_max = models.FloatField(blank=True, null=True)
+    reactive_sum = models.FloatField(default=0)
+    reactive_count = models.PositiveIntegerField(default=0)
+    reactive_min = models.FloatField(blank=True, null=True)
+    reactive_max = models.FloatField(blank=True, null=True)
+    apparent_sum = models.FloatField(default=0)
+    apparent_count = models.PositiveIntegerField(default=0)
+    apparent_min = models.FloatField(blank=True, null=True)
+    apparent_max = models.FloatField(blank=True, null=True)
+    power_factor_sum = models.FloatField(default=0)
+    power_factor_count = models.PositiveIntegerField(default=0)
+    power_factor_min = models.FloatField(blank=True, null=True)
+    power_factor_max = models.FloatField(blank=True, null=True)
+    freq_sum = models.FloatField(default=0)
+    freq_count = models.PositiveIntegerField(default=0)
+    freq_min = models.FloatField(blank=True, null=True)
+    freq_max = models.FloatField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["smart_meter", "resolution", "bucket_start"],
+                name="unique_meter_rollup_bucket",
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["resolution", "bucket_start"], name="meter_rollup_res_time_idx"
+            ),
+        ]
+
+    # Average of field over the bucket, None without readings of the field
+    # data_points counts samples; {field}_count only the samples that had the field
+    def avg(self, field):
+        count = getattr(self, f"{field}_count")
+        if not count:
+            return None
+        return getattr(self, f"{field}_sum") / count
+
+    def __str__(self):
+        return f"{self.get_resolution_display()} Rollup - {self.smart_meter.field_name} at {self.bucket_start}"
+
+
+# Poll attempts and successes per smart meter and 10 minute bucket (UTC), upserted every
+# sweep; meters skipped by the circuit breaker count as failed attempts
+class PollStats(models.Model):
+    smart_meter = models.ForeignKey(SmartMeter, on_delete=models.CASCADE)
+    bucket_start = models.DateTimeField()
+    attempts = models.PositiveIntegerField(default=0)
+    successes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["smart_meter", "bucket_start"], name="unique_poll_stats_bucket"
+            )
+        ]
+        indexes = [models.Index(fields=["bucket_start"], name="poll_stats_time_idx")]
+
+    def __str__(self):
+        return f"Poll Stats - {self.smart_meter.field_name} at {self.bucket_start}"
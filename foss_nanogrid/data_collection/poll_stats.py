@@ -0,0 +1,78 @@
+import datetime
+
+import pytz
+from django.db import connection, models
+
+from data_collection.models import PollStats
+from data_collection.rollups import bucket_start
+from data_collection.upsert import merge_upsert_sql
+
+"""
+Connectivity statistics for smart meters. Every sweep adds one attempt per smart meter,
+and one success per meter that returned a reading, to 10 minute PollStats buckets in a
+single upsert. Connectivity over a window is successes / attempts summed over the buckets
+in it, so the devices endpoint answers 1 hour to 7 day windows with one grouped query
+over at most (meters x 1008) small rows, independent of RealTimeMeter retention.
+"""
+
+BUCKET_MINUTES = 10
+
+# Windows reported by connectivity(); longest window sets the PollStats retention needed
+CONNECTIVITY_WINDOWS = {
+    "1h": datetime.timedelta(hours=1),
+    "24h": datetime.timedelta(hours=24),
+    "7d": datetime.timedelta(days=7),
+}
+
+
+# Count one attempt for every meter of a sweep and a success for each that has a sample
+def record_poll_stats(smart_meters, samples, now: datetime.datetime = None):
+    if not smart_meters:
+        return
+    now = datetime.datetime.now(pytz.utc) if now is None else now
+    start = connection.ops.adapt_datetimefield_value(bucket_start(now, BUCKET_MINUTES))
+    answered = {sample.smart_meter_id for sample in samples}
+
+    params = []
+    for sm in smart_meters:
+        params += [sm.pk, start, 1, 1 if sm.pk in answered else 0]
+    sql = merge_upsert_sql(
+        PollStats,
+        len(smart_meters),
+        key_columns=["smart_meter_id", "bucket_start"],
+        add_columns=["attempts", "successes"],
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+# Connectivity percentage per smart meter pk and window; None where nothing was attempted
+# Windows cover whole buckets, starting at the bucket containing now - window
+def connectivity(now: datetime.datetime = None) -> dict:
+    now = datetime.datetime.now(pytz.utc) if now is None else now
+    starts = {
+        name: bucket_start(now - window, BUCKET_MINUTES)
+        for name, window in CONNECTIVITY_WINDOWS.items()
+    }
+    aggregates = {}
+    for name, start in starts.items():
+        in_window = models.Q(bucket_start__gte=start)
+        aggregates[f"attempts_{name}"] = models.Sum("attempts", filter=in_window)
+        aggregates[f"successes_{name}"] = models.Sum("successes", filter=in_window)
+    rows = (
+        PollStats.objects.filter(bucket_start__gte=min(starts.values()))
+        .values("smart_meter_id")
+        .annotate(**aggregates)
+    )
+
+    result = {}
+    for row in rows:
+        result[row["smart_meter_id"]] = {
+            name: (
+                round(100 * row[f"successes_{name}"] / row[f"attempts_{name}"], 1)
+                if row[f"attempts_{name}"]
+                else None
+            )
+            for name in CONNECTIVITY_WINDOWS
+        }
+    return result
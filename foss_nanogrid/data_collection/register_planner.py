@@ -0,0 +1,71 @@
+from typing import NamedTuple
+
+"""
+Plans Modbus holding register reads so that a list of register addresses is fetched
+in the fewest contiguous block reads. Each address in TCP_REGS refers to a 32 bit
+float stored in the two registers starting at (address - 2). Spans closer together
+than max_gap unused registers are merged into one block as long as the block stays
+within the 125 register limit of a single Modbus read.
+"""
+
+# Maximum number of registers returned by a single read_holding_registers request
+MAX_READ_COUNT = 125
+
+# Default number of unused registers allowed between two spans in the same block
+MAX_REGISTER_GAP = 40
+
+# Offset from a TCP_REGS address to its first register and number of registers per value
+REGISTER_OFFSET = 2
+REGISTER_WIDTH = 2
+
+
+class RegisterBlock(NamedTuple):
+    start: int  # first register address of the read
+    count: int  # number of registers to read
+    values: list  # (index into the planned address list, offset of value in block)
+
+
+# Merge the register spans of addresses into the fewest block reads
+def plan_register_reads(
+    addresses, max_gap: int = MAX_REGISTER_GAP, max_count: int = MAX_READ_COUNT
+) -> list:
+    assert max_count >= REGISTER_WIDTH, f"max_count must be at least {REGISTER_WIDTH}"
+    spans = sorted(
+        (addr - REGISTER_OFFSET, i) for i, addr in enumerate(addresses)
+    )
+
+    blocks = []
+    start, end, values = None, None, []
+    for span_start, i in spans:
+        span_end = span_start + REGISTER_WIDTH
+        if (
+            start is not None
+            and span_start - end <= max_gap
+            and max(end, span_end) - start <= max_count
+        ):
+            end = max(end, span_end)
+        else:
+            if start is not None:
+                blocks.append(RegisterBlock(start, end - start, values))
+            start, end, values = span_start, span_end, []
+        values.append((i, span_start - start))
+
+    if start is not None:
+        blocks.append(RegisterBlock(start, end - start, values))
+    return blocks
+
+
+# One block per value of block, for devices that refuse the unused registers inside it
+def split_block(block: RegisterBlock) -> list:
+    return [
+        RegisterBlock(block.start + offset, REGISTER_WIDTH, [(i, 0)])
+        for i, offset in block.values
+    ]
+
+
+# Slice the raw registers of each value out of one block read; returns {address index: registers}
+# Decoding is left to SmartMeterReciever.conv_to_32bitfloats so a sweep is decoded in one pass
+def extract_block_registers(block: RegisterBlock, registers) -> dict:
+    return {
+        i: registers[offset : offset + REGISTER_WIDTH] for i, offset in block.values
+    }
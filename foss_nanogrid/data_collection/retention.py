@@ -0,0 +1,145 @@
+import datetime
+import logging
+import time
+
+from django.db import connection
+
+from data_collection.archive import COLUMNS, archive_rows
+from data_collection.models import MeterRollup, PollStats, RealTimeMeter
+
+log = logging.getLogger(__name__)
+
+"""
+Chunked retention for RealTimeMeter, the minute tier of MeterRollup and PollStats.
+Expired rows are removed with raw DELETE statements of at most batch_size rows, each
+committed on its own, so row locks are only held briefly and the 10 second inserts are
+never blocked behind one large delete. Rows are never loaded into Python (unlike
+QuerySet.delete(), which collects them first); nothing references these tables, so
+there is nothing to cascade. Batches walk the tables' time indexes.
+When archiving is enabled, expired real time rows are written to the columnar archive
+before they are deleted.
+"""
+
+# Default number of rows removed per DELETE statement
+PRUNE_BATCH_SIZE = 5000
+
+# RealTimeMeter fields in the order expected by archive_rows
+ARCHIVE_FIELDS = ["smart_meter_id"] + list(COLUMNS)
+
+
+# Single bounded DELETE of the rows of model matching where, oldest primary keys first
+def _delete_batch_sql(model, where: str) -> str:
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    if connection.vendor == "mysql":
+        # MySQL has no LIMIT in IN (subquery) but supports DELETE ... ORDER BY ... LIMIT
+        return f"DELETE FROM {table} WHERE {where} ORDER BY {qn('id')} LIMIT %s"
+    return (
+        f"DELETE FROM {table} WHERE {qn('id')} IN "
+        f"(SELECT {qn('id')} FROM {table} WHERE {where} ORDER BY {qn('id')} LIMIT %s)"
+    )
+
+
+# Run bounded DELETEs until fewer than batch_size rows match; returns (rows deleted, seconds taken)
+def _prune(model, where: str, params: list, batch_size: int, pause: float) -> tuple:
+    assert batch_size > 0, "batch_size must be positive"
+    sql = _delete_batch_sql(model, where)
+    params = params + [batch_size]
+
+    deleted = 0
+    batches = 0
+    started = time.perf_counter()
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rowcount = cursor.rowcount
+        deleted += rowcount
+        batches += 1
+        if rowcount < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    elapsed = time.perf_counter() - started
+
+    log.info(
+        f"Pruned {deleted} {model.__name__} rows in {batches} batches, "
+        f"{elapsed:.2f}s ({deleted / elapsed if elapsed else 0:.0f} rows/s)"
+    )
+    return deleted, elapsed
+
+
+# Archive and delete RealTimeMeter rows older than cutoff, one id ordered batch at a time
+# The batch is selected, appended to the archive, then deleted by (timestamp, id) range;
+# the n oldest ids before cutoff are exactly the rows with id <= the largest selected id
+def _archive_and_prune(cutoff, batch_size: int, pause: float, archive_dir) -> tuple:
+    assert batch_size > 0, "batch_size must be positive"
+    qn = connection.ops.quote_name
+    sql = (
+        f"DELETE FROM {qn(RealTimeMeter._meta.db_table)} "
+        f"WHERE {qn('timestamp')} < %s AND {qn('id')} <= %s"
+    )
+    expired = RealTimeMeter.objects.filter(timestamp__lt=cutoff).order_by("id")
+
+    deleted = 0
+    batches = 0
+    started = time.perf_counter()
+    while True:
+        rows = list(expired.values_list("id", *ARCHIVE_FIELDS)[:batch_size])
+        if not rows:
+            break
+        archive_rows([row[1:] for row in rows], archive_dir)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                sql, [connection.ops.adapt_datetimefield_value(cutoff), rows[-1][0]]
+            )
+            deleted += cursor.rowcount
+        batches += 1
+        if len(rows) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    elapsed = time.perf_counter() - started
+
+    log.info(
+        f"Archived and pruned {deleted} RealTimeMeter rows in {batches} batches, "
+        f"{elapsed:.2f}s ({deleted / elapsed if elapsed else 0:.0f} rows/s)"
+    )
+    return deleted, elapsed
+
+
+# Delete RealTimeMeter rows older than cutoff in batches; returns (rows deleted, seconds taken)
+# pause is slept between batches to leave room for concurrent inserts
+# With an archive_dir rows are appended to the columnar archive (data_collection.archive) first
+def prune_real_time_meters(
+    cutoff: datetime.datetime,
+    batch_size: int = PRUNE_BATCH_SIZE,
+    pause: float = 0.0,
+    archive_dir=None,
+) -> tuple:
+    if archive_dir is not None:
+        return _archive_and_prune(cutoff, batch_size, pause, archive_dir)
+    where = f"{connection.ops.quote_name('timestamp')} < %s"
+    params = [connection.ops.adapt_datetimefield_value(cutoff)]
+    return _prune(RealTimeMeter, where, params, batch_size, pause)
+
+
+# Delete minute tier rollups that start before cutoff; coarser tiers are kept
+def prune_minute_rollups(
+    cutoff: datetime.datetime, batch_size: int = PRUNE_BATCH_SIZE, pause: float = 0.0
+) -> tuple:
+    qn = connection.ops.quote_name
+    where = f"{qn('resolution')} = %s AND {qn('bucket_start')} < %s"
+    params = [
+        int(MeterRollup.Resolution.MINUTE),
+        connection.ops.adapt_datetimefield_value(cutoff),
+    ]
+    return _prune(MeterRollup, where, params, batch_size, pause)
+
+
+# Delete PollStats buckets that start before cutoff
+def prune_poll_stats(
+    cutoff: datetime.datetime, batch_size: int = PRUNE_BATCH_SIZE, pause: float = 0.0
+) -> tuple:
+    where = f"{connection.ops.quote_name('bucket_start')} < %s"
+    params = [connection.ops.adapt_datetimefield_value(cutoff)]
+    return _prune(PollStats, where, params, batch_size, pause)
@@ -0,0 +1,169 @@
+import datetime
+
+import pytz
+from django.db import connection
+from django.db.models import Max, Q
+
+from data_collection.models import MeterRollup
+from data_collection.upsert import merge_upsert_sql
+
+"""
+Tiered rollups of real time data: 1 minute, 30 minute and daily count/sum/min/max per
+smart meter (MeterRollup). Each stored poll sweep is upserted into the minute tier with a
+single statement. Once a bucket of a coarser tier has closed it is built exactly once by
+combining the rows of the tier below (minute -> 30 minute -> day), so raw RealTimeMeter
+data is never rescanned and RealTimeMeter retention does not affect history. Buckets are
+aligned to UTC. Missing readings (None) are left out of a field's statistics: each field
+has its own count of readings, averages are sum / count, min/max are None without any.
+"""
+
+MINUTE = MeterRollup.Resolution.MINUTE
+THIRTY_MIN = MeterRollup.Resolution.THIRTY_MIN
+DAY = MeterRollup.Resolution.DAY
+
+# RealTimeMeter fields that are rolled up
+ROLLUP_FIELDS = ["active", "reactive", "apparent", "power_factor", "freq"]
+
+# Tier that each coarser tier is built from
+SOURCE_TIER = {THIRTY_MIN: MINUTE, DAY: THIRTY_MIN}
+
+
+# Start (UTC) of the bucket of the given resolution (minutes) containing timestamp
+def bucket_start(timestamp: datetime.datetime, resolution: int = THIRTY_MIN):
+    seconds = int(resolution) * 60
+    epoch = int(timestamp.timestamp())
+    return datetime.datetime.fromtimestamp(epoch - epoch % seconds, pytz.utc)
+
+
+# min or max of two values where None stands for no value
+def _extreme(function, a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return function(a, b)
+
+
+# Upsert statement merging the minute statistics of every row into the existing buckets
+def _upsert_sql(num_rows: int) -> str:
+    return merge_upsert_sql(
+        MeterRollup,
+        num_rows,
+        key_columns=["smart_meter_id", "resolution", "bucket_start"],
+        add_columns=["data_points"]
+        + [f"{f}_sum" for f in ROLLUP_FIELDS]
+        + [f"{f}_count" for f in ROLLUP_FIELDS],
+        min_columns=[f"{f}_min" for f in ROLLUP_FIELDS],
+        max_columns=[f"{f}_max" for f in ROLLUP_FIELDS],
+    )
+
+
+# Add RealTimeMeter samples (saved or not) to their minute rollups in one query
+def rollup_samples(samples):
+    n = len(ROLLUP_FIELDS)
+    buckets = {}
+    for sample in samples:
+        key = (sample.smart_meter_id, bucket_start(sample.timestamp, MINUTE))
+        stats = buckets.get(key)
+        if stats is None:
+            # data_points, then the sums, counts, mins and maxes of the fields
+            stats = buckets[key] = [0] + [0.0] * n + [0] * n + [None] * (2 * n)
+        stats[0] += 1
+        for i, field in enumerate(ROLLUP_FIELDS):
+            value = getattr(sample, field)
+            if value is None:
+                continue
+            stats[1 + i] += value
+            stats[1 + n + i] += 1
+            stats[1 + 2 * n + i] = _extreme(min, stats[1 + 2 * n + i], value)
+            stats[1 + 3 * n + i] = _extreme(max, stats[1 + 3 * n + i], value)
+
+    if not buckets:
+        return
+    params = []
+    for (sm_id, start), stats in buckets.items():
+        params += [sm_id, int(MINUTE), connection.ops.adapt_datetimefield_value(start)]
+        params += stats
+    with connection.cursor() as cursor:
+        cursor.execute(_upsert_sql(len(buckets)), params)
+
+
+# Combine rollup rows (dicts) into buckets of a coarser resolution
+def _combine(rows, resolution: int) -> list:
+    combined = {}
+    for row in rows:
+        key = (row["smart_meter_id"], bucket_start(row["bucket_start"], resolution))
+        acc = combined.get(key)
+        if acc is None:
+            combined[key] = dict(row, bucket_start=key[1], resolution=resolution)
+            continue
+        acc["data_points"] += row["data_points"]
+        for field in ROLLUP_FIELDS:
+            acc[f"{field}_sum"] += row[f"{field}_sum"]
+            acc[f"{field}_count"] += row[f"{field}_count"]
+            for stat, function in (("min", min), ("max", max)):
+                column = f"{field}_{stat}"
+                acc[column] = _extreme(function, acc[column], row[column])
+    return [MeterRollup(**values) for values in combined.values()]
+
+
+# Build every closed, not yet built bucket of resolution (before now) from its source tier
+# Returns the new rollups; each bucket is only built once
+def build_rollups(resolution: int, now: datetime.datetime = None) -> list:
+    now = datetime.datetime.now(pytz.utc) if now is None else now
+    closed_before = bucket_start(now, resolution)
+
+    source = MeterRollup.objects.filter(
+        resolution=SOURCE_TIER[resolution], bucket_start__lt=closed_before
+    )
+    # each meter continues after its own latest bucket, so a meter whose data arrives
+    # late is not skipped because other meters are further ahead
+    latest = dict(
+        MeterRollup.objects.filter(resolution=resolution)
+        .values("smart_meter_id")
+        .annotate(latest=Max("bucket_start"))
+        .values_list("smart_meter_id", "latest")
+    )
+    if latest:
+        step = datetime.timedelta(minutes=int(resolution))
+        pending = ~Q(smart_meter_id__in=list(latest))
+        for sm_id, bucket in latest.items():
+            pending |= Q(smart_meter_id=sm_id, bucket_start__gte=bucket + step)
+        source = source.filter(pending)
+
+    columns = ["smart_meter_id", "bucket_start", "data_points"] + [
+        f"{field}_{stat}"
+        for field in ROLLUP_FIELDS
+        for stat in ("sum", "count", "min", "max")
+    ]
+    rollups = _combine(source.values(*columns).iterator(), resolution)
+    MeterRollup.objects.bulk_create(rollups, batch_size=1000)
+    return rollups
+
+
+# Rollups of a smart meter between start and end as dicts with avg/min/max per field
+# Without a resolution the finest tier with at most max_points buckets is used
+def read_rollups(
+    smart_meter, start, end, resolution: int = None, max_points: int = 2000
+) -> list:
+    if resolution is None:
+        span_minutes = (end - start).total_seconds() / 60
+        resolution = next(
+            (r for r in (MINUTE, THIRTY_MIN) if span_minutes / r <= max_points), DAY
+        )
+    rollups = MeterRollup.objects.filter(
+        smart_meter=smart_meter,
+        resolution=resolution,
+        bucket_start__gte=start,
+        bucket_start__lt=end,
+    ).order_by("bucket_start")
+
+    result = []
+    for rollup in rollups:
+        row = {"bucket_start": rollup.bucket_start, "data_points": rollup.data_points}
+        for field in ROLLUP_FIELDS:
+            row[f"{field}_avg"] = rollup.avg(field)
+            row[f"{field}_min"] = getattr(rollup, f"{field}_min")
+            row[f"{field}_max"] = getattr(rollup, f"{field}_max")
+        result.append(row)
+    return result
@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from data_collection.models import RealTimeMeter
+
+"""
+Snapshot of the latest reading and status of every smart meter, kept in the Django cache
+(settings.CACHES, shared by the pollers and the web server). The poller rewrites it after
+every stored sweep, so metrics.rt_all_meters is served with a single cache read instead
+of one RealTimeMeter query per meter. Meters without a reading in a sweep keep their last
+values and are marked as not recieving info. The snapshot expires after
+RT_SNAPSHOT_TIMEOUT seconds so a stopped poller is not mistaken for live data.
+"""
+
+RT_SNAPSHOT_KEY = "data_collection:rt_snapshot"
+
+
+# Dashboard dict of a smart meter and its latest RealTimeMeter reading (or None)
+def rt_data_dict(sm, reading=None, recieving_info=None) -> dict:
+    if reading is None:
+        return {
+            "name": sm.field_name,
+            "recievingInfo": False,
+            "active": 0,
+            "reactive": 0,
+            "apparent": 0,
+            "frequency": 0,
+            "powerFactor": 0,
+        }
+    return {
+        "name": sm.field_name,
+        "recievingInfo": sm.recieving_info if recieving_info is None else recieving_info,
+        "active": reading.active,
+        "reactive": reading.reactive,
+        "apparent": reading.apparent,
+        "frequency": reading.freq,
+        "powerFactor": reading.power_factor,
+    }
+
+
+# Dashboard dict of a smart meter from its latest stored reading (one query)
+def rt_data_dict_from_db(sm) -> dict:
+    try:
+        return rt_data_dict(
+            sm, RealTimeMeter.objects.filter(smart_meter=sm).latest("timestamp")
+        )
+    except RealTimeMeter.DoesNotExist:
+        return rt_data_dict(sm)
+
+
+# Rewrite the snapshot after a sweep; samples are the RealTimeMeter rows stored by it
+def update_rt_snapshot(smart_meters, samples):
+    previous = cache.get(RT_SNAPSHOT_KEY)
+    readings = {sample.smart_meter_id: sample for sample in samples}
+
+    snapshot = {}
+    for sm in smart_meters:
+        if sm.pk in readings:
+            snapshot[sm.pk] = rt_data_dict(sm, readings[sm.pk], recieving_info=True)
+            continue
+        if previous is not None and sm.pk in previous:
+            entry = dict(previous[sm.pk], name=sm.field_name)
+        else:
+            # first snapshot of this meter; start from its stored data
+            entry = rt_data_dict_from_db(sm)
+        entry["recievingInfo"] = False
+        snapshot[sm.pk] = entry
+    cache.set(RT_SNAPSHOT_KEY, snapshot, timeout=settings.RT_SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+# Latest snapshot as {smart meter pk: dashboard dict}, or None if there is none
+def get_rt_snapshot():
+    return cache.get(RT_SNAPSHOT_KEY)
+
+
+async def aget_rt_snapshot():
+    return await cache.aget(RT_SNAPSHOT_KEY)
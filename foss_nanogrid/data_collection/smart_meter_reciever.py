@@ -2,6 +2,7 @@ import logging
 
 log = logging.getLogger(__name__)
 
+import numpy as np
 from pymodbus.client import ModbusTcpClient as ModbusClient
 from pymodbus.payload import BinaryPayloadDecoder
 from pymodbus.constants import Endian
@@ -45,6 +46,17 @@ class SmartMeterReciever:
         else:
             raise Exception("Incorrect payload length in 32bit conversion")
 
+    # Decode many register pairs at once with the same byte/word order as conv_to_32bitfloat
+    # registers: array-like of shape (..., 2k); returns array of shape (..., k)
+    @staticmethod
+    def conv_to_32bitfloats(registers, dtype=np.float64) -> np.ndarray:
+        regs = np.asarray(registers, dtype=np.uint16)
+        if regs.shape[-1] % 2 != 0:
+            raise Exception("Incorrect payload length in 32bit conversion")
+        # word order LITTLE: low word comes first, so swap each pair to high word first
+        words = regs.reshape(*regs.shape[:-1], -1, 2)[..., ::-1].astype(">u2")
+        return words.view(">f4")[..., 0].astype(dtype)
+
     def add_register_addr(self, address):
         self.source_address.append(address)
 
@@ -1,85 +1,107 @@
 import datetime
 import logging
-import requests
 
-from data_collection.smart_meter_reciever import SmartMeterReciever
-from data_collection.models import RealTimeMeter, SmartMeter, ThirtyMinAvg
+from data_collection.modbus_poller import run_sweep
+from data_collection.poll_stats import CONNECTIVITY_WINDOWS, record_poll_stats
+from data_collection.retention import (
+    prune_minute_rollups,
+    prune_poll_stats,
+    prune_real_time_meters,
+)
+from data_collection.rt_snapshot import update_rt_snapshot
+from data_collection.rollups import (
+    DAY,
+    ROLLUP_FIELDS,
+    THIRTY_MIN,
+    bucket_start,
+    build_rollups,
+    rollup_samples,
+)
+from forecasting.helper_functions.weather_api import get_conditions_batch
+from data_collection.models import (
+    MeterRollup,
+    RealTimeMeter,
+    SmartMeter,
+    ThirtyMinAvg,
+)
 
 log = logging.getLogger(__name__)
 from celery import shared_task
-from pymodbus.client import ModbusTcpClient as ModbusClient
-from pymodbus.exceptions import ConnectionException
-from django.db import models
-import environ
+from django.conf import settings
+from django.db import transaction
 import pytz
 
-env = environ.Env()
-environ.Env.read_env()
-XWEATHER_CLIENT_ID = env("XWEATHER_CLIENT_ID")
-XWEATHER_CLIENT_SECRET = env("XWEATHER_CLIENT_SECRET")
 REAL_TIME_DATA_BACKLOG = 120  # minutes
-XWEATHER_BASE_URL = "https://api.aerisapi.com/conditions"
 
+# ThirtyMinAvg weather fields as returned by _calc_weather_data
+WEATHER_FIELDS = [
+    "temp_C",
+    "humidity",
+    "feels_like_C",
+    "wind_dir_deg",
+    "wind_speed_kph",
+    "ghi_Wm2",
+    "precip_mm",
+    "sky",
+    "visibility_km",
+    "dewpoint_C",
+]
 
-# get smart meter data task
-def _get_sm_data(
-    source_address, host, port, timeout, name, timezone, secondary_id=1, regs=5
-):
-    vals = []  # values from smart meter
-    log.debug("Connecting to Smart Meter " + name + " ...")
-    try:
-        client = ModbusClient(host=host, port=port, timeout=timeout)
-    except Exception as exc:
-        log.error(f"Failed to establish ModbusClient: ({exc})")
-        return
-    try:
-        for addr in source_address:
-            response = client.read_holding_registers(
-                (addr) - 2, count=3, slave=secondary_id
+
+# store the values of one poll sweep; constant number of queries for any fleet size
+def _store_sweep(results, regs=5):
+    timestamp = datetime.datetime.now(pytz.utc)
+    samples = []
+    started_recieving = []
+    stopped_recieving = []
+    for sm, vals in results:
+        recieving = vals is not None and len(vals) == regs
+        if recieving:
+            samples.append(
+                RealTimeMeter(
+                    smart_meter=sm,
+                    timestamp=timestamp,
+                    active=vals[0],
+                    reactive=vals[1],
+                    apparent=vals[2],
+                    power_factor=vals[3],
+                    freq=vals[4],
+                )
             )
-            if not response.isError():
-                rr = SmartMeterReciever.conv_to_32bitfloat(response.registers)
-                vals.append(rr)
-            else:
-                pass
-                log.debug(f"Reg. error at {addr}: {response}")
-    except ConnectionException as exc:
-        log.info(f"Failed to connect to SM: {name}")
-        client.close()
-
-    except Exception as exc:
-        log.error(f"Received Modbus Exception: {exc}")
-        client.close()
-        return
-
-    if len(vals) == regs:
-        SmartMeter.objects.filter(field_name=name).update(recieving_info=True)
-        RealTimeMeter.objects.create(
-            smart_meter=SmartMeter.objects.get(field_name=name),
-            timestamp=datetime.datetime.now(timezone),
-            active=vals[0],
-            reactive=vals[1],
-            apparent=vals[2],
-            power_factor=vals[3],
-            freq=vals[4],
-        )
-    else:
-        SmartMeter.objects.filter(field_name=name).update(recieving_info=False)
+        # only touch meters whose status changed
+        if recieving and not sm.recieving_info:
+            started_recieving.append(sm.pk)
+        elif not recieving and sm.recieving_info:
+            stopped_recieving.append(sm.pk)
 
-# get data from all smart meters; reduces celery task messages
+    with transaction.atomic():
+        RealTimeMeter.objects.bulk_create(samples)
+        rollup_samples(samples)
+        if started_recieving:
+            SmartMeter.objects.filter(pk__in=started_recieving).update(
+                recieving_info=True
+            )
+        if stopped_recieving:
+            SmartMeter.objects.filter(pk__in=stopped_recieving).update(
+                recieving_info=False
+            )
+    return samples
+
+
+# get data from all smart meters concurrently; reduces celery task messages
 def _get_all_sm_data():
-    smart_meters = SmartMeter.objects.all()
-    for sm in smart_meters:
-        timezone = pytz.timezone(sm.timezone)
-
-        _get_sm_data(
-            source_address=SmartMeterReciever.SOURCE_ADDRESS,
-            host=sm.ip_address,
-            port=SmartMeterReciever.PORT,
-            timeout=SmartMeterReciever.TIMEOUT,
-            name=sm.field_name,
-            timezone=timezone,
-        )
+    smart_meters = list(SmartMeter.objects.all())
+    results = run_sweep(
+        smart_meters,
+        max_concurrency=settings.SM_POLL_MAX_CONCURRENCY,
+        max_gap=settings.SM_REGISTER_MAX_GAP,
+    )
+    samples = _store_sweep(results)
+    record_poll_stats(smart_meters, samples)
+    try:
+        update_rt_snapshot(smart_meters, samples)
+    except Exception as e:
+        log.error(f"Failed to update real time snapshot: {e}")
 
 
 # celery task for getting all smart meter data
@@ -129,99 +151,163 @@ def _calc_weather_data(weather_data: dict):
     }
 
 
-# get terperature data for one smart meter
-def _get_temp_data(sm: SmartMeter, params: dict):
-    response = requests.get(
-        f"{XWEATHER_BASE_URL}/{sm.latitude},{sm.longitude}",
-        params=params,
+# Grid cell used to share one weather request between nearby smart meters
+def _weather_cell(sm: SmartMeter) -> tuple:
+    return (
+        round(sm.latitude, settings.WEATHER_GRID_DECIMALS),
+        round(sm.longitude, settings.WEATHER_GRID_DECIMALS),
     )
 
-    if response.status_code == 200:
-        try:
-            response_dict = response.json()
-            return _calc_weather_data(response_dict)
 
-        except Exception as e:
-            log.error(
-                f"Failed to get temperature data for SM {sm.field_name}, Error: {e}"
-            )
-            return False
-    else:
-        log.info(
-            f"API temperature call failed for SM {sm.field_name}, Status: {response.status_code}"
-        )
-        return False
+# Averaged weather data per (grid cell, bucket); one batched Xweather call per bucket
+def _get_cell_weather(cells_by_bucket: dict) -> dict:
+    weather = {}
+    for bucket, cells in cells_by_bucket.items():
+        cells = sorted(cells)
+        bucket_end = bucket + datetime.timedelta(minutes=THIRTY_MIN)
+        responses = get_conditions_batch(cells, start=bucket, end=bucket_end)
+        for cell, response in zip(cells, responses):
+            try:
+                weather[(cell, bucket)] = _calc_weather_data(response) if response else None
+            except Exception as e:
+                log.error(f"Failed to get weather data for cell {cell}, Error: {e}")
+                weather[(cell, bucket)] = None
+    return weather
 
 
+# Query count is independent of the number of smart meters
 def _calc_thirty_min_avg():
     # get all smart meters
-    smart_meters = SmartMeter.objects.all()
+    smart_meters = {sm.pk: sm for sm in SmartMeter.objects.all()}
     log.info("Calculating 30 minute averages...")
-    for sm in smart_meters:
-        dt = datetime.datetime.now(pytz.timezone(sm.timezone))
-
-        # define parameters for http request to Xweather API
-        params = {
-            "format": "json",
-            "filter": "10min",
-            "client_id": XWEATHER_CLIENT_ID,
-            "client_secret": XWEATHER_CLIENT_SECRET,
-            "from": f"{dt - datetime.timedelta(minutes=30)}",
-            "to": f"{dt}",
-        }
-
-        # get all real time meters for the smart meter
-        rt_meters = RealTimeMeter.objects.filter(smart_meter=sm)
-
-        # get all real time meters within the last 30 minutes
-        lst_30_mins = rt_meters.filter(
-            timestamp__gte=dt - datetime.timedelta(minutes=30)
-        )
-        num_data_points = lst_30_mins.count()
-
-        # calculate the average of the real time meters
-        avg = lst_30_mins.aggregate(
-            active=models.Avg("active"),
-            reactive=models.Avg("reactive"),
-            apparent=models.Avg("apparent"),
-            power_factor=models.Avg("power_factor"),
-            freq=models.Avg("freq"),
-        )
+
+    # most recently closed 30 minute bucket
+    now = datetime.datetime.now(pytz.utc)
+    last_bucket = bucket_start(now, THIRTY_MIN) - datetime.timedelta(minutes=THIRTY_MIN)
+
+    # close the 30 minute and daily rollup tiers, each built once from the tier below
+    with transaction.atomic():
+        build_rollups(THIRTY_MIN, now)
+        build_rollups(DAY, now)
+
+    # 30 minute rollups from the last emitted bucket on; averages are sum / count of readings
+    half_bucket = datetime.timedelta(minutes=THIRTY_MIN / 2)
+    closed = MeterRollup.objects.filter(
+        resolution=THIRTY_MIN, bucket_start__lte=last_bucket
+    )
+    latest_avg = (
+        ThirtyMinAvg.objects.order_by("-timestamp")
+        .values_list("timestamp", flat=True)
+        .first()
+    )
+    if latest_avg is not None:
+        closed = closed.filter(bucket_start__gte=latest_avg - half_bucket)
+    buckets = {(rollup.smart_meter_id, rollup.bucket_start): rollup for rollup in closed}
+    for sm_id in smart_meters:
+        buckets.setdefault((sm_id, last_bucket), None)  # meters without data still get a row
+
+    # nearest neighbor temporal interpolation
+    already_emitted = set(
+        ThirtyMinAvg.objects.filter(
+            timestamp__in={bucket + half_bucket for _, bucket in buckets}
+        ).values_list("smart_meter_id", "timestamp")
+    )
+
+    pending = [
+        (smart_meters[sm_id], bucket, rollup)
+        for (sm_id, bucket), rollup in sorted(buckets.items())
+        if sm_id in smart_meters and (sm_id, bucket + half_bucket) not in already_emitted
+    ]
+
+    # Weather is fetched once per grid cell and fanned out to the meters in it
+    cells_by_bucket = {}
+    for sm, bucket, _ in pending:
+        cells_by_bucket.setdefault(bucket, set()).add(_weather_cell(sm))
+    cell_weather = _get_cell_weather(cells_by_bucket)
+
+    thirty_min_avgs = []
+    for sm, bucket, rollup in pending:
+        timestamp = bucket + half_bucket
+
+        num_data_points = rollup.data_points if rollup else 0
+        avg = {field: (rollup.avg(field) if rollup else None) for field in ROLLUP_FIELDS}
         log.debug(f"Thirty minute averages: {avg}")
 
-        # Call for temperature data
-        temp_data = _get_temp_data(sm, params)
+        temp_data = cell_weather.get((_weather_cell(sm), bucket)) or dict.fromkeys(
+            WEATHER_FIELDS
+        )
 
         # create a new ThirtyMinAvg object
-        ThirtyMinAvg.objects.create(
-            smart_meter=sm,
-            timestamp=dt
-            - datetime.timedelta(minutes=15),  # nearest neighbor temporal interpolation
-            active=avg["active"],
-            reactive=avg["reactive"],
-            apparent=avg["apparent"],
-            power_factor=avg["power_factor"],
-            freq=avg["freq"],
-            data_points=num_data_points,
-            temp_C=temp_data["temp_C"],
-            humidity=temp_data["humidity"],
-            feels_like_C=temp_data["feels_like_C"],
-            wind_dir_deg=temp_data["wind_dir_deg"],
-            wind_speed_kph=temp_data["wind_speed_kph"],
-            ghi_Wm2=temp_data["ghi_Wm2"],
-            precip_mm=temp_data["precip_mm"],
-            sky=temp_data["sky"],
-            visibility_km=temp_data["visibility_km"],
-            dewpoint_C=temp_data["dewpoint_C"],
+        thirty_min_avgs.append(
+            ThirtyMinAvg(
+                smart_meter=sm,
+                timestamp=timestamp,
+                active=avg["active"],
+                reactive=avg["reactive"],
+                apparent=avg["apparent"],
+                power_factor=avg["power_factor"],
+                freq=avg["freq"],
+                data_points=num_data_points,
+                temp_C=temp_data["temp_C"],
+                humidity=temp_data["humidity"],
+                feels_like_C=temp_data["feels_like_C"],
+                wind_dir_deg=temp_data["wind_dir_deg"],
+                wind_speed_kph=temp_data["wind_speed_kph"],
+                ghi_Wm2=temp_data["ghi_Wm2"],
+                precip_mm=temp_data["precip_mm"],
+                sky=temp_data["sky"],
+                visibility_km=temp_data["visibility_km"],
+                dewpoint_C=temp_data["dewpoint_C"],
+            )
         )
 
-        # delete all real time meters older than 30 minutes
-        rt_meters.filter(
-            timestamp__lt=dt - datetime.timedelta(minutes=REAL_TIME_DATA_BACKLOG)
-        ).delete()
+    ThirtyMinAvg.objects.bulk_create(thirty_min_avgs)
     return True
 
 
 @shared_task
 def calc_thirty_min_avg():
     _calc_thirty_min_avg()
+
+
+# delete real time meters older than REAL_TIME_DATA_BACKLOG and expired minute rollups in bounded batches
+def _prune_real_time_data():
+    cutoff = datetime.datetime.now(pytz.utc) - datetime.timedelta(
+        minutes=REAL_TIME_DATA_BACKLOG
+    )
+    deleted, elapsed = prune_real_time_meters(
+        cutoff,
+        batch_size=settings.RT_PRUNE_BATCH_SIZE,
+        pause=settings.RT_PRUNE_BATCH_PAUSE,
+        archive_dir=settings.RT_ARCHIVE_DIR if settings.RT_ARCHIVE_ENABLED else None,
+    )
+
+    # minute rollups are kept for ROLLUP_MINUTE_RETENTION_DAYS; coarser tiers are kept
+    rollup_cutoff = datetime.datetime.now(pytz.utc) - datetime.timedelta(
+        days=settings.ROLLUP_MINUTE_RETENTION_DAYS
+    )
+    rollups_deleted, rollup_elapsed = prune_minute_rollups(
+        rollup_cutoff,
+        batch_size=settings.RT_PRUNE_BATCH_SIZE,
+        pause=settings.RT_PRUNE_BATCH_PAUSE,
+    )
+
+    # poll stats are only needed for the longest connectivity window
+    stats_cutoff = datetime.datetime.now(pytz.utc) - max(CONNECTIVITY_WINDOWS.values())
+    stats_deleted, _ = prune_poll_stats(
+        stats_cutoff - datetime.timedelta(days=1),
+        batch_size=settings.RT_PRUNE_BATCH_SIZE,
+        pause=settings.RT_PRUNE_BATCH_PAUSE,
+    )
+    return {
+        "deleted": deleted,
+        "seconds": elapsed,
+        "minute_rollups_deleted": rollups_deleted,
+        "minute_rollup_seconds": rollup_elapsed,
+        "poll_stats_deleted": stats_deleted,
+    }
+
+
+@shared_task
+def prune_real_time_data():
+    return _prune_real_time_data()
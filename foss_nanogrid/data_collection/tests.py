@@ -1,11 +1,46 @@
 from cgi import test
+from decimal import Decimal
 from importlib.metadata import distribution
 from numbers import Real
-from django.test import TestCase
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from pymodbus.exceptions import ConnectionException, ModbusException
+from unittest import mock
+import asyncio
 import datetime
+import io
+import numpy as np
+import pyarrow
+import pyarrow.parquet
+import tempfile
 
-from .models import RealTimeMeter, SmartMeter, ThirtyMinAvg
-from .tasks import _calc_thirty_min_avg, _calc_weather_data
+from .archive import archive_rows, read_archive
+from .export import export_rows
+from .meter_health import MeterHealth
+from .modbus_poller import poll_smart_meters
+from .modbus_pool import ModbusConnectionPool
+from .models import MeterRollup, RealTimeMeter, SmartMeter, ThirtyMinAvg
+from .register_planner import plan_register_reads, split_block
+from .retention import prune_real_time_meters
+from .rollups import (
+    DAY,
+    MINUTE,
+    THIRTY_MIN,
+    bucket_start,
+    build_rollups,
+    read_rollups,
+    rollup_samples,
+)
+from .smart_meter_reciever import TCP_REGS, SmartMeterReciever
+from .tasks import (
+    _calc_thirty_min_avg,
+    _calc_weather_data,
+    _prune_real_time_data,
+    _store_sweep,
+)
 
 
 # Create your tests here.
@@ -305,12 +340,684 @@ class DataCollectionTestCase(TestCase):
         weather_data = _calc_weather_data(test_dict)
         self.assertEqual(weather_data["temp_C"], 28.985)
 
-    def test_calc_thirty_min_avg(self):
-        _calc_thirty_min_avg()
+    def test_rollup_samples(self):
+        sm = SmartMeter.objects.get(field_name="EC_SM1")
+        bucket = bucket_start(
+            datetime.datetime(2024, 6, 13, 11, 47, 30, tzinfo=datetime.timezone.utc),
+            MINUTE,
+        )
+        self.assertEqual((bucket.minute, bucket.second), (47, 0))
+        for i in [3, 1, 2]:
+            rollup_samples(
+                [
+                    RealTimeMeter(
+                        smart_meter=sm,
+                        timestamp=bucket + datetime.timedelta(seconds=10 * i),
+                        active=i,
+                        reactive=i,
+                        apparent=i,
+                        power_factor=i,
+                        freq=i,
+                    )
+                ]
+            )
+        rollup = MeterRollup.objects.get(smart_meter=sm, resolution=MINUTE)
         self.assertEqual(
-            RealTimeMeter.objects.all().count(), 10
-        )  # test deletion of old data
+            (rollup.data_points, rollup.active_min, rollup.active_max), (3, 1.0, 3.0)
+        )
+        self.assertEqual(rollup.avg("active"), 2.0)
+
+    def test_rollup_samples_skips_missing_values(self):
+        sm = SmartMeter.objects.get(field_name="EC_SM1")
+        minute = datetime.datetime(2024, 6, 13, 11, 47, tzinfo=datetime.timezone.utc)
+        samples = [
+            RealTimeMeter(smart_meter=sm, timestamp=minute, active=-2, freq=None),
+            RealTimeMeter(smart_meter=sm, timestamp=minute, active=None, freq=None),
+        ]
+        rollup_samples(samples[:1])
+        rollup_samples(samples[1:])
+        rollup_samples([RealTimeMeter(smart_meter=sm, timestamp=minute, active=-4)])
+        rollup = MeterRollup.objects.get(smart_meter=sm, resolution=MINUTE)
+        self.assertEqual((rollup.data_points, rollup.active_count), (3, 2))
+        self.assertEqual((rollup.active_min, rollup.active_max), (-4.0, -2.0))
+        self.assertEqual(rollup.avg("active"), -3.0)
+        self.assertEqual(
+            (rollup.freq_count, rollup.freq_min, rollup.freq_max), (0, None, None)
+        )
+        self.assertIsNone(rollup.avg("freq"))
+
+        # the coarser tiers keep ignoring the missing values
+        thirty_min = build_rollups(THIRTY_MIN, minute + datetime.timedelta(hours=1))
+        self.assertEqual(
+            (thirty_min[0].active_max, thirty_min[0].freq_max), (-2.0, None)
+        )
+
+    def test_build_rollups(self):
+        # each tier is built once from the tier below
+        sm = SmartMeter.objects.get(field_name="EC_SM1")
+        day = datetime.datetime(2024, 6, 13, tzinfo=datetime.timezone.utc)
+        rollup_samples(
+            [
+                RealTimeMeter(
+                    smart_meter=sm,
+                    timestamp=day + datetime.timedelta(minutes=20 * i),
+                    active=i,
+                    reactive=i,
+                    apparent=i,
+                    power_factor=i,
+                    freq=i,
+                )
+                for i in range(6)
+            ]
+        )
+        now = day + datetime.timedelta(days=1, minutes=5)
+        self.assertEqual(len(build_rollups(THIRTY_MIN, now)), 4)
+        self.assertEqual(build_rollups(THIRTY_MIN, now), [])
+        daily = build_rollups(DAY, now)
+        self.assertEqual(len(daily), 1)
+        self.assertEqual(
+            (daily[0].data_points, daily[0].active_sum, daily[0].active_max),
+            (6, 15.0, 5.0),
+        )
+
+        rows = read_rollups(sm, day, day + datetime.timedelta(hours=2))
+        self.assertEqual([row["data_points"] for row in rows], [1] * 6)
+        rows = read_rollups(sm, day, day + datetime.timedelta(days=1), max_points=100)
+        self.assertEqual([row["active_avg"] for row in rows], [0.5, 2.0, 3.5, 5.0])
+
+    def test_build_rollups_per_meter(self):
+        # a meter whose minute data arrives late still gets its buckets built
+        sm1 = SmartMeter.objects.get(field_name="EC_SM1")
+        sm2 = SmartMeter.objects.get(pk=sm1.pk)
+        sm2.pk, sm2.field_name, sm2.ip_address = None, "EC_SM2", "172.20.49.5"
+        sm2.save()
+        day = datetime.datetime(2024, 6, 13, tzinfo=datetime.timezone.utc)
+        now = day + datetime.timedelta(hours=2)
+        rollup_samples([RealTimeMeter(smart_meter=sm1, timestamp=day, active=1)])
+        rollup_samples(
+            [RealTimeMeter(smart_meter=sm1, timestamp=now - datetime.timedelta(minutes=31))]
+        )
+        self.assertEqual(len(build_rollups(THIRTY_MIN, now)), 2)
+
+        rollup_samples([RealTimeMeter(smart_meter=sm2, timestamp=day, active=2)])
+        late = build_rollups(THIRTY_MIN, now)
+        self.assertEqual(
+            [(r.smart_meter_id, r.bucket_start) for r in late], [(sm2.pk, day)]
+        )
+        self.assertEqual(build_rollups(THIRTY_MIN, now), [])
+
+    def test_calc_thirty_min_avg(self):
+        # real time data reaches the 30 minute averages through the minute rollups
+        sm = SmartMeter.objects.get(field_name="EC_SM1")
+        last_bucket = bucket_start(
+            datetime.datetime.now(datetime.timezone.utc)
+        ) - datetime.timedelta(minutes=30)
+        rollup_samples(
+            [
+                RealTimeMeter(
+                    smart_meter=sm,
+                    timestamp=last_bucket + datetime.timedelta(minutes=i),
+                    active=i,
+                    reactive=i,
+                    apparent=i,
+                    power_factor=i,
+                    freq=i,
+                )
+                for i in range(10)
+            ]
+        )
+        with mock.patch(
+            "data_collection.tasks.get_conditions_batch",
+            side_effect=lambda cells, **_: [_conditions_response(20)] * len(cells),
+        ):
+            _calc_thirty_min_avg()
         self.assertEqual(
             ThirtyMinAvg.objects.all().count(), 1
         )  # test creation of 30 min avg
         self.assertEqual(ThirtyMinAvg.objects.get().active, 4.5)
+        self.assertEqual(
+            MeterRollup.objects.get(resolution=THIRTY_MIN).data_points, 10
+        )
+
+        # averages are only emitted once per bucket
+        with mock.patch("data_collection.tasks.get_conditions_batch") as batch:
+            _calc_thirty_min_avg()
+        batch.assert_not_called()
+        self.assertEqual(ThirtyMinAvg.objects.all().count(), 1)
+
+    def test_calc_thirty_min_avg_weather_cells(self):
+        # meters are grouped by grid cell; each cell is fetched once and shared by its meters
+        template = SmartMeter.objects.get(field_name="EC_SM1")
+        coordinates = {
+            "EC_SM1": (35.146506, 33.415653),
+            "EC_SM2": (35.148, 33.418),  # same cell as EC_SM1 at 2 decimals
+            "EC_SM3": (35.161, 33.402),
+            "EC_SM4": (35.158, 33.398),  # same cell as EC_SM3
+        }
+        for i, (name, (latitude, longitude)) in enumerate(coordinates.items()):
+            sm = SmartMeter.objects.get(pk=template.pk)
+            if name != "EC_SM1":
+                sm.pk, sm.field_name, sm.ip_address = None, name, f"172.20.50.{i}"
+            sm.latitude, sm.longitude = latitude, longitude
+            sm.save()
+        temperatures = {
+            (Decimal("35.15"), Decimal("33.42")): 21.0,
+            (Decimal("35.16"), Decimal("33.40")): 31.0,
+        }
+
+        def conditions_batch(cells, start, end):
+            return [_conditions_response(temperatures[cell]) for cell in cells]
+
+        with mock.patch(
+            "data_collection.tasks.get_conditions_batch", side_effect=conditions_batch
+        ) as batch:
+            _calc_thirty_min_avg()
+        self.assertEqual(batch.call_count, 1)  # one bucket
+        self.assertEqual(sorted(batch.call_args.args[0]), sorted(temperatures))
+        self.assertEqual(
+            dict(ThirtyMinAvg.objects.values_list("smart_meter__field_name", "temp_C")),
+            {"EC_SM1": 21.0, "EC_SM2": 21.0, "EC_SM3": 31.0, "EC_SM4": 31.0},
+        )
+
+    def test_prune_real_time_data(self):
+        self.assertEqual(
+            _prune_real_time_data()["deleted"], 1
+        )  # test deletion of old data
+        self.assertEqual(RealTimeMeter.objects.all().count(), 10)
+
+        # several bounded batches delete everything older than the cutoff
+        cutoff = datetime.datetime.now(datetime.timezone.utc)
+        self.assertEqual(prune_real_time_meters(cutoff, batch_size=3)[0], 10)
+        self.assertFalse(RealTimeMeter.objects.exists())
+
+    def test_prune_real_time_data_archive(self):
+        # expired rows are archived before deletion and can be read back by time range
+        sm = SmartMeter.objects.get(field_name="EC_SM1")
+        now = datetime.datetime.now(datetime.timezone.utc)
+        expected = list(
+            RealTimeMeter.objects.order_by("timestamp").values_list("timestamp", "active")
+        )
+        with tempfile.TemporaryDirectory() as archive_dir:
+            deleted, _ = prune_real_time_meters(now, batch_size=4, archive_dir=archive_dir)
+            self.assertEqual(deleted, 11)
+            self.assertFalse(RealTimeMeter.objects.exists())
+
+            frame = read_archive(
+                sm.pk, now - datetime.timedelta(days=1), now, archive_dir
+            )
+            self.assertEqual(list(frame["active"]), [active for _, active in expected])
+            self.assertEqual(frame.index[0], expected[0][0])
+
+            # rows archived twice are only returned once
+            archive_rows([(sm.pk, expected[-1][0], 1, 1, 1, 1, 1)], archive_dir)
+            frame = read_archive(
+                sm.pk, expected[-1][0], now, archive_dir, columns=["freq"]
+            )
+            self.assertEqual(list(frame.columns), ["freq"])
+            self.assertEqual(len(frame), 1)
+
+    def test_export_raw_history(self):
+        # pruned samples come from the archive, the rest from the table, in time order
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with tempfile.TemporaryDirectory() as archive_dir, override_settings(
+            RT_ARCHIVE_ENABLED=True, RT_ARCHIVE_DIR=archive_dir
+        ):
+            prune_real_time_meters(
+                now - datetime.timedelta(minutes=60), archive_dir=archive_dir
+            )
+            self.assertEqual(RealTimeMeter.objects.count(), 10)
+            out = io.StringIO()
+            call_command(
+                "export_meter_history",
+                "--source=raw",
+                f"--start={(now - datetime.timedelta(days=1)).isoformat()}",
+                f"--end={(now + datetime.timedelta(minutes=1)).isoformat()}",
+                "--fields",
+                "active",
+                "freq",
+                "--chunk-size=3",
+                stdout=out,
+            )
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "meter,timestamp,active,freq")
+        rows = [line.split(",") for line in lines[1:]]
+        self.assertEqual([float(row[2]) for row in rows], [10] + list(range(10)))
+        self.assertEqual({row[0] for row in rows}, {"EC_SM1"})
+
+    def test_export_parquet(self):
+        sm = SmartMeter.objects.get(field_name="EC_SM1")
+        now = datetime.datetime.now(datetime.timezone.utc)
+        RealTimeMeter.objects.create(smart_meter=sm, timestamp=now, active=None, freq=50)
+        with tempfile.TemporaryDirectory() as directory:
+            path = f"{directory}/raw.parquet"
+            err = io.StringIO()
+            call_command(
+                "export_meter_history",
+                "--source=raw",
+                f"--start={(now - datetime.timedelta(days=1)).isoformat()}",
+                f"--end={(now + datetime.timedelta(minutes=1)).isoformat()}",
+                "--fields",
+                "active",
+                "freq",
+                "--format=parquet",
+                f"--output={path}",
+                "--chunk-size=5",
+                stderr=err,
+            )
+            parquet = pyarrow.parquet.ParquetFile(path)
+            table = parquet.read()
+
+        self.assertEqual(
+            table.schema,
+            pyarrow.schema(
+                [
+                    ("meter", pyarrow.string()),
+                    ("timestamp", pyarrow.timestamp("us", tz="UTC")),
+                    ("active", pyarrow.float64()),
+                    ("freq", pyarrow.float64()),
+                ]
+            ),
+        )
+        self.assertEqual(table.num_rows, RealTimeMeter.objects.count())
+        self.assertIn(f"Exported {table.num_rows} rows", err.getvalue())
+        self.assertEqual(parquet.num_row_groups, 3)  # 12 rows in chunks of 5
+        rows = table.to_pylist()
+        self.assertEqual(rows[-1]["active"], None)
+        self.assertEqual(rows[-1]["freq"], 50.0)
+        self.assertEqual(rows[-1]["timestamp"], now)
+        self.assertEqual({row["meter"] for row in rows}, {"EC_SM1"})
+
+    def test_export_rows_same_timestamp(self):
+        # rows sharing (meter, timestamp) are all exported across chunk boundaries
+        sm = SmartMeter.objects.get(field_name="EC_SM1")
+        timestamp = datetime.datetime(2024, 6, 13, tzinfo=datetime.timezone.utc)
+        RealTimeMeter.objects.bulk_create(
+            RealTimeMeter(smart_meter=sm, timestamp=timestamp, active=i) for i in range(5)
+        )
+        rows = export_rows(
+            "raw", [sm], timestamp, timestamp + datetime.timedelta(seconds=1), ["active"], 2
+        )
+        self.assertEqual([row[2] for row in rows], [0, 1, 2, 3, 4])
+
+    def test_store_sweep(self):
+        sm = SmartMeter.objects.get(field_name="EC_SM1")
+        _store_sweep([(sm, [1.0, 2.0, 3.0, 0.9, 50.0])])
+        self.assertEqual(RealTimeMeter.objects.filter(smart_meter=sm).count(), 12)
+        self.assertTrue(SmartMeter.objects.get(pk=sm.pk).recieving_info)
+
+        # unchanged status is not written again
+        sm.refresh_from_db()
+        with CaptureQueriesContext(connection) as ctx:
+            _store_sweep([(sm, [1.0, 2.0, 3.0, 0.9, 50.0])])
+        self.assertFalse(
+            any(q["sql"].startswith("UPDATE") for q in ctx.captured_queries)
+        )
+
+        _store_sweep([(sm, None)])
+        self.assertFalse(SmartMeter.objects.get(pk=sm.pk).recieving_info)
+
+
+class _FakeClock:
+    # monotonic clock advanced only by sleep() and by the sweeps themselves
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class CollectSmDataTestCase(TestCase):
+    # Run the collector on a fake clock; sweep(clock) stands in for one sweep
+    def _collect(self, sweep, **options):
+        command = "data_collection.management.commands.collect_sm_data"
+        clock = _FakeClock()
+        self.pool, self.loop = mock.Mock(), mock.Mock()
+        patchers = [
+            mock.patch(f"{command}.time", clock),
+            mock.patch(f"{command}._get_all_sm_data", side_effect=lambda: sweep(clock)),
+            mock.patch(f"{command}.get_connection_pool", return_value=self.pool),
+            mock.patch(f"{command}.get_event_loop", return_value=self.loop),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        call_command("collect_sm_data", **options)
+        return clock
+
+    def test_sweeps_on_schedule_and_cleans_up(self):
+        starts = []
+        durations = iter([25.0, 1.0])  # the first sweep overruns two 10 second ticks
+
+        def sweep(clock):
+            starts.append(clock.now)
+            clock.now += next(durations)
+
+        clock = self._collect(sweep, interval=10, sweeps=2)
+        # missed ticks are skipped: the next sweep waits for the tick at 30s
+        self.assertEqual(starts, [0.0, 30.0])
+        self.assertEqual(clock.sleeps, [5.0])
+        self.pool.close.assert_called_once()
+        self.loop.close.assert_called_once()
+
+    def test_failed_sweep_does_not_stop_collector(self):
+        starts = []
+
+        def sweep(clock):
+            starts.append(clock.now)
+            if len(starts) == 1:
+                raise Exception("database unavailable")
+
+        clock = self._collect(sweep, interval=10, sweeps=2)
+        self.assertEqual(starts, [0.0, 10.0])
+        self.assertEqual(clock.sleeps, [10.0])
+        self.pool.close.assert_called_once()
+
+
+# Individual Xweather conditions response with one period at temperature temp_C
+def _conditions_response(temp_C) -> dict:
+    period = {
+        "tempC": temp_C,
+        "humidity": 50,
+        "feelslikeC": temp_C,
+        "windDirDEG": 0,
+        "windSpeedKPH": 1,
+        "solrad": {"ghiWM2": 100},
+        "precipMM": 0,
+        "sky": 0,
+        "visibilityKM": 10,
+        "dewpointC": 5,
+    }
+    return {"success": True, "response": [{"periods": [period]}]}
+
+
+class RegisterPlannerTestCase(TestCase):
+    def test_plan_merges_tcp_regs(self):
+        blocks = plan_register_reads(TCP_REGS, max_gap=40)
+        self.assertEqual(len(blocks), 1)
+        self.assertEqual((blocks[0].start, blocks[0].count), (3058, 92))
+        self.assertEqual(
+            sorted(blocks[0].values), [(0, 0), (1, 8), (2, 16), (3, 90), (4, 50)]
+        )
+
+    def test_plan_respects_gap_and_read_limit(self):
+        self.assertEqual(len(plan_register_reads(TCP_REGS, max_gap=0)), len(TCP_REGS))
+        blocks = plan_register_reads(TCP_REGS, max_gap=40, max_count=60)
+        self.assertEqual([(b.start, b.count) for b in blocks], [(3058, 52), (3148, 2)])
+
+    def test_split_block(self):
+        block = plan_register_reads(TCP_REGS, max_gap=40)[0]
+        singles = split_block(block)
+        self.assertEqual(
+            sorted((b.start, b.count, b.values) for b in singles),
+            sorted((addr - 2, 2, [(i, 0)]) for i, addr in enumerate(TCP_REGS)),
+        )
+
+
+class RegisterDecodeTestCase(TestCase):
+    # batch decoder must match the per-pair BinaryPayloadDecoder (BIG bytes, LITTLE words)
+    def test_conv_to_32bitfloats_matches_decoder(self):
+        registers = np.random.default_rng(0).integers(0, 2**16, size=(100, 10))
+        expected = [
+            [
+                SmartMeterReciever.conv_to_32bitfloat(list(row[i : i + 2]))
+                for i in range(0, len(row), 2)
+            ]
+            for row in registers
+        ]
+        decoded = SmartMeterReciever.conv_to_32bitfloats(registers)
+        np.testing.assert_array_equal(decoded, np.array(expected))
+        self.assertEqual(SmartMeterReciever.conv_to_32bitfloats([0, 0x3FC0]), [1.5])
+
+
+class MeterHealthTestCase(TestCase):
+    def test_circuit_opens_and_backs_off(self):
+        health = MeterHealth()
+        for _ in range(MeterHealth.FAILURE_THRESHOLD):
+            self.assertTrue(health.should_poll(0))
+            health.record_failure(0)
+        self.assertTrue(health.circuit_open)
+        self.assertFalse(health.should_poll(MeterHealth.PROBE_BASE - 1))
+        self.assertTrue(health.should_poll(MeterHealth.PROBE_BASE))
+
+        # failed probe doubles the wait; success closes the circuit
+        health.record_failure(100)
+        self.assertFalse(health.should_poll(100 + MeterHealth.PROBE_BASE))
+        self.assertTrue(health.should_poll(100 + 2 * MeterHealth.PROBE_BASE))
+        health.record_success()
+        self.assertFalse(health.circuit_open)
+        self.assertTrue(health.should_poll(0))
+
+    def test_polling_runs_on_its_own_queue(self):
+        # breaker and connection state are per process: polls must reach the poller worker
+        from foss_nanogrid.celery import app
+
+        route = app.amqp.router.route({}, "data_collection.tasks.get_all_sm_data")
+        self.assertEqual(route["queue"].name, settings.SM_POLL_QUEUE_NAME)
+        route = app.amqp.router.route({}, "data_collection.tasks.calc_thirty_min_avg")
+        self.assertEqual(route["queue"].name, settings.TASK_QUEUE_NAME)
+
+
+class _FakeResponse:
+    def __init__(self, registers=None):
+        self.registers = registers
+
+    def isError(self):
+        return self.registers is None
+
+
+class _FakeModbus:
+    # In-memory stand-in for AsyncModbusTcpClient; hosts missing from servers are unreachable
+    def __init__(self, servers=None, delays=None, unmapped=None):
+        self.servers = servers or {}  # host -> {register address: value}
+        self.delays = delays or {}  # host -> seconds per read
+        self.unmapped = unmapped or {}  # host -> addresses answered with illegal address
+        self.reads = []  # (host, address, count) of every read
+        self.clients = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def client(self, host, port, timeout, reconnect_delay):
+        client = _FakeClient(self, host)
+        self.clients.append(client)
+        return client
+
+
+class _FakeClient:
+    def __init__(self, modbus, host):
+        self.modbus = modbus
+        self.host = host
+        self.connected = False
+        self.fail_next = False
+
+    async def connect(self):
+        self.connected = self.host in self.modbus.servers
+        return self.connected
+
+    def close(self):
+        self.connected = False
+
+    async def read_holding_registers(self, address, count, slave):
+        if self.fail_next:
+            raise ModbusException("read failed")
+        self.modbus.in_flight += 1
+        self.modbus.max_in_flight = max(self.modbus.max_in_flight, self.modbus.in_flight)
+        try:
+            await asyncio.sleep(self.modbus.delays.get(self.host, 0))
+        finally:
+            self.modbus.in_flight -= 1
+        self.modbus.reads.append((self.host, address, count))
+        addresses = range(address, address + count)
+        if self.modbus.unmapped.get(self.host, set()).intersection(addresses):
+            return _FakeResponse()  # exception response: illegal data address
+        registers = self.modbus.servers[self.host]
+        return _FakeResponse([registers.get(a, 0) for a in addresses])
+
+
+class ModbusPoolTestCase(TestCase):
+    def setUp(self):
+        self.modbus = _FakeModbus(servers={"10.0.0.1": {}})
+        patcher = mock.patch(
+            "data_collection.modbus_pool.AsyncModbusTcpClient", self.modbus.client
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_connection_reused(self):
+        pool = ModbusConnectionPool(timeout=0.2)
+
+        async def use_twice():
+            async with pool.connection("10.0.0.1", 502) as first:
+                pass
+            async with pool.connection("10.0.0.1", 502) as second:
+                pass
+            return first, second
+
+        first, second = asyncio.run(use_twice())
+        self.assertIs(first, second)
+        self.assertEqual(len(self.modbus.clients), 1)
+        self.assertEqual(len(pool), 1)
+
+    def test_reconnect_after_failure(self):
+        pool = ModbusConnectionPool(timeout=0.2, backoff_base=0.05, backoff_max=0.05)
+
+        async def fail_then_reconnect():
+            with self.assertRaises(ModbusException):
+                async with pool.connection("10.0.0.1", 502) as client:
+                    client.fail_next = True
+                    await client.read_holding_registers(0, count=2, slave=1)
+            self.assertFalse(client.connected)
+
+            # no reconnect while backing off
+            with self.assertRaises(ConnectionException):
+                async with pool.connection("10.0.0.1", 502):
+                    pass
+            self.assertEqual(len(self.modbus.clients), 1)
+
+            await asyncio.sleep(0.06)
+            async with pool.connection("10.0.0.1", 502) as reconnected:
+                self.assertTrue(reconnected.connected)
+            return client, reconnected
+
+        client, reconnected = asyncio.run(fail_then_reconnect())
+        self.assertIsNot(client, reconnected)
+        self.assertEqual(pool._connections[("10.0.0.1", 502)].failures, 0)
+
+    def test_unreachable_host_backs_off(self):
+        pool = ModbusConnectionPool(timeout=0.2)
+
+        async def connect_twice():
+            for _ in range(2):
+                with self.assertRaises(ConnectionException):
+                    async with pool.connection("10.0.0.2", 502):
+                        pass
+
+        asyncio.run(connect_twice())
+        # the second attempt falls in the backoff window, so only one handshake was made
+        self.assertEqual(len(self.modbus.clients), 1)
+        self.assertEqual(pool._connections[("10.0.0.2", 502)].failures, 1)
+
+    def test_backoff_bounds(self):
+        pool = ModbusConnectionPool(timeout=0.2, backoff_base=1.0, backoff_max=60.0)
+        for failures in range(1, 12):
+            delay = min(60.0, 2.0 ** (failures - 1))
+            for _ in range(100):
+                backoff = pool._backoff(failures)
+                self.assertGreaterEqual(backoff, delay / 2)
+                self.assertLessEqual(backoff, delay)
+        self.assertLessEqual(max(pool._backoff(100) for _ in range(100)), 60.0)
+
+
+# Registers of a meter whose values are the given floats, in SOURCE_ADDRESS order
+def _meter_registers(values) -> dict:
+    registers = {}
+    for addr, value in zip(SmartMeterReciever.SOURCE_ADDRESS, values):
+        high, low = np.array([value], dtype=">f4").view(">u2").tolist()
+        registers[addr - 2], registers[addr - 1] = low, high
+    return registers
+
+
+class PollEngineTestCase(TestCase):
+    def setUp(self):
+        regs = len(SmartMeterReciever.SOURCE_ADDRESS)
+        self.smart_meters = [
+            SmartMeter(
+                field_name=f"SM{i}", ip_address=f"10.0.0.{i}", modbus_port=502, secondary_id=1
+            )
+            for i in range(6)
+        ]
+        # SM3 is unreachable; earlier meters answer slower so they finish last
+        self.expected = {
+            sm.field_name: [i + 0.5 * k for k in range(regs)]
+            for i, sm in enumerate(self.smart_meters)
+            if sm.field_name != "SM3"
+        }
+        self.modbus = _FakeModbus(
+            servers={
+                f"10.0.0.{i}": _meter_registers(self.expected[f"SM{i}"])
+                for i in range(6)
+                if i != 3
+            },
+            delays={f"10.0.0.{i}": 0.01 * (6 - i) for i in range(6)},
+        )
+        patcher = mock.patch(
+            "data_collection.modbus_pool.AsyncModbusTcpClient", self.modbus.client
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.dict("data_collection.modbus_poller._split_blocks")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _poll(self, max_concurrency):
+        pool = ModbusConnectionPool(timeout=0.2)
+        self.addCleanup(pool.close)
+        return asyncio.run(
+            poll_smart_meters(self.smart_meters, max_concurrency=max_concurrency, pool=pool)
+        )
+
+    def test_results_in_meter_order_and_decoded(self):
+        results = self._poll(max_concurrency=32)
+        self.assertEqual([sm for sm, _ in results], self.smart_meters)
+        for sm, values in results:
+            self.assertEqual(values, self.expected.get(sm.field_name))
+
+    def test_unreachable_meter_returns_none(self):
+        results = dict((sm.field_name, values) for sm, values in self._poll(32))
+        self.assertIsNone(results["SM3"])
+        self.assertEqual(sum(values is not None for values in results.values()), 5)
+
+    def test_concurrency_bounded_by_semaphore(self):
+        self._poll(max_concurrency=2)
+        self.assertEqual(self.modbus.max_in_flight, 2)
+        self.modbus.max_in_flight = 0
+        self._poll(max_concurrency=32)
+        self.assertEqual(self.modbus.max_in_flight, 5)
+
+    def test_unmapped_gap_register_splits_block(self):
+        # a merged block covering an unmapped register is re-read value by value
+        plan = plan_register_reads(SmartMeterReciever.SOURCE_ADDRESS)
+        block = next(block for block in plan if len(block.values) > 1)
+        used = {block.start + offset + k for _, offset in block.values for k in range(2)}
+        gap = min(set(range(block.start, block.start + block.count)) - used)
+        self.modbus.unmapped["10.0.0.0"] = {gap}
+
+        results = dict((sm.field_name, values) for sm, values in self._poll(32))
+        self.assertEqual(results["SM0"], self.expected["SM0"])
+        first_reads = [read for read in self.modbus.reads if read[0] == "10.0.0.0"]
+        self.assertIn(("10.0.0.0", block.start, block.count), first_reads)
+        self.assertEqual(len(first_reads), len(plan) + len(block.values))
+
+        # the split is remembered: the next sweep does not try the merged block again
+        self.modbus.reads.clear()
+        results = dict((sm.field_name, values) for sm, values in self._poll(32))
+        self.assertEqual(results["SM0"], self.expected["SM0"])
+        reads = [read for read in self.modbus.reads if read[0] == "10.0.0.0"]
+        self.assertNotIn(("10.0.0.0", block.start, block.count), reads)
+        self.assertEqual(len(reads), len(plan) - 1 + len(block.values))
+        # other meters keep the merged reads
+        self.assertIn(("10.0.0.1", block.start, block.count), self.modbus.reads)
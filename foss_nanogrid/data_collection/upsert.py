@@ -0,0 +1,46 @@
+from django.db import connection
+
+"""
+Multi-row upserts that merge new values into existing rows in a single statement:
+INSERT ... ON CONFLICT DO UPDATE (sqlite, postgres) or ON DUPLICATE KEY UPDATE (MySQL).
+Used for counters and statistics that are updated on every poll sweep (minute rollups,
+poll statistics), where a read-modify-write per row would cost a query per meter.
+"""
+
+
+# Upsert of num_rows rows into model's table; params per row are key_columns, add_columns,
+# min_columns, max_columns in that order. On conflict with key_columns (which must be a
+# unique constraint) add columns are summed and min/max columns keep the extreme value,
+# ignoring NULL (no value yet) on either side.
+def merge_upsert_sql(
+    model, num_rows: int, key_columns, add_columns, min_columns=(), max_columns=()
+) -> str:
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    columns = list(key_columns) + list(add_columns) + list(min_columns) + list(max_columns)
+    row = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    sql = (
+        f"INSERT INTO {table} ({', '.join(qn(c) for c in columns)}) "
+        f"VALUES {', '.join([row] * num_rows)} "
+    )
+
+    # sqlite has no LEAST/GREATEST; its multi-argument min()/max() are scalar
+    if connection.vendor == "sqlite":
+        least, greatest = "MIN", "MAX"
+    else:
+        least, greatest = "LEAST", "GREATEST"
+    if connection.vendor == "mysql":
+        old, new = (lambda c: qn(c)), (lambda c: f"VALUES({qn(c)})")
+    else:
+        old, new = (lambda c: f"{table}.{qn(c)}"), (lambda c: f"excluded.{qn(c)}")
+    # LEAST/GREATEST are NULL if an argument is NULL; each side falls back to the other
+    either = lambda c: f"COALESCE({old(c)}, {new(c)}), COALESCE({new(c)}, {old(c)})"
+    updates = ", ".join(
+        [f"{qn(c)} = {old(c)} + {new(c)}" for c in add_columns]
+        + [f"{qn(c)} = {least}({either(c)})" for c in min_columns]
+        + [f"{qn(c)} = {greatest}({either(c)})" for c in max_columns]
+    )
+    if connection.vendor == "mysql":
+        return sql + f"ON DUPLICATE KEY UPDATE {updates}"
+    conflict = ", ".join(qn(c) for c in key_columns)
+    return sql + f"ON CONFLICT ({conflict}) DO UPDATE SET {updates}"
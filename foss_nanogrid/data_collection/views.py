@@ -13,7 +13,16 @@ log = logging.getLogger(__name__)
 
 
 # Start data collection (meant for development)
+# Optional param collector=true leaves real-time polling to the collect_sm_data command
 def start_data_collection(request):
+    use_collector = request.GET.get("collector", "").lower() in [
+        "true",
+        "1",
+        "t",
+        "y",
+        "yes",
+    ]
+
     schedule_10_sec, created = IntervalSchedule.objects.get_or_create(
         every=10,
         period=IntervalSchedule.SECONDS,
@@ -24,6 +33,11 @@ def start_data_collection(request):
         period=IntervalSchedule.MINUTES,
     )
 
+    schedule_5_min, created = IntervalSchedule.objects.get_or_create(
+        every=5,
+        period=IntervalSchedule.MINUTES,
+    )
+
     # Start real-time data collection – failed connections will not be retried (must implement in future)
     try:
         PeriodicTask.objects.get(name="get_all_sm_data").delete()
@@ -31,15 +45,18 @@ def start_data_collection(request):
         log.error(f"Failed to delete get_all_sm_data: {e}")
         pass
 
-    try:
-        PeriodicTask.objects.get_or_create(
-            interval=schedule_10_sec,
-            name="get_all_sm_data",
-            task="data_collection.tasks.get_all_sm_data",
-            args=[],
-        )
-    except Exception as e:
-        log.error(f"Failed to start data collection: {e}")
+    if use_collector:
+        log.info("Real-time data collection left to the collect_sm_data command")
+    else:
+        try:
+            PeriodicTask.objects.get_or_create(
+                interval=schedule_10_sec,
+                name="get_all_sm_data",
+                task="data_collection.tasks.get_all_sm_data",
+                args=[],
+            )
+        except Exception as e:
+            log.error(f"Failed to start data collection: {e}")
 
     # Start 30 min avg calculations
     try:
@@ -53,4 +70,16 @@ def start_data_collection(request):
         task="data_collection.tasks.calc_thirty_min_avg",
     )
 
+    # Start retention pruning of real time data (independent of the 30 min avg job)
+    try:
+        PeriodicTask.objects.get(name="prune_real_time_data").delete()
+    except:
+        pass
+
+    PeriodicTask.objects.get_or_create(
+        interval=schedule_5_min,
+        name="prune_real_time_data",
+        task="data_collection.tasks.prune_real_time_data",
+    )
+
     return HttpResponse("Data collection started")
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ForecastingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'forecasting'
+
+    # Predictors are loaded on first use; optionally load them with the app instead
+    def ready(self):
+        if settings.FORECAST_MODELS_WARM_UP:
+            from .registry import warm_up
+
+            warm_up()
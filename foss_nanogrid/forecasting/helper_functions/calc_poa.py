@@ -14,4 +14,23 @@ def calculate_poa_irradiance(solar_zenith, ghi, inclination, solar_azimuth, site
     if poa < 0:
         poa = 0
     
-    return poa
\ No newline at end of file
+    return poa
+
+
+# Calculate the POA from the GHI for whole arrays of zenith, GHI and azimuth at once; same
+# result as calculate_poa_irradiance, and 0 when the sun is at or below the horizon
+def calculate_poa_irradiance_array(solar_zenith, ghi, inclination, solar_azimuth, site_azimuth) -> np.ndarray:
+    elevation = 90 - np.asarray(solar_zenith, dtype=np.float64)
+    ghi = np.asarray(ghi, dtype=np.float64)
+    sin_elevation = np.sin(np.radians(elevation))
+
+    # no division by sin(elevation) <= 0; those periods get no irradiance
+    daylight = elevation > 0
+    sincident = np.divide(ghi, sin_elevation, out=np.zeros_like(ghi * sin_elevation), where=daylight)
+    sincident = np.where(sincident < 0, 0, sincident)
+
+    poa = sincident * (np.cos(np.radians(elevation)) * np.sin(np.radians(inclination)) * np.cos(np.radians(site_azimuth - np.asarray(solar_azimuth, dtype=np.float64))) + sin_elevation * np.cos(np.radians(inclination)))
+
+    poa = np.where(poa < 0, 0, poa)
+
+    return np.where(daylight, poa, 0.0)
@@ -0,0 +1,69 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+"""
+Single-pass evaluation of an XGBoost ensemble. The features are converted once to a
+float32 matrix (the type XGBoost predicts with, so the values do not change) and every
+member predicts from it with Booster.inplace_predict, skipping the per-call DataFrame
+conversion of XGBRegressor.predict. Members run concurrently in a process-wide pool of
+FORECAST_ENSEMBLE_WORKERS threads; XGBoost releases the GIL while predicting. Results
+are combined in member order, so the weighted average is the same as the sequential loop.
+"""
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.FORECAST_ENSEMBLE_WORKERS,
+                    thread_name_prefix="ensemble",
+                )
+    return _executor
+
+
+# Predictions of one XGBRegressor on a float32 matrix, as XGBRegressor.predict would make them
+def _predict(reg, matrix: np.ndarray) -> np.ndarray:
+    # models trained with early stopping predict with their best iteration
+    try:
+        iteration_range = (0, reg.best_iteration + 1)
+    except AttributeError:
+        iteration_range = (0, 0)
+    return reg.get_booster().inplace_predict(
+        matrix,
+        iteration_range=iteration_range,
+        missing=reg.missing,
+        validate_features=False,
+    )
+
+
+# Predictions of every regressor on the same features, in the order of regs
+def predict_all(regs: list, features: pd.DataFrame) -> list:
+    feature_names = regs[0].get_booster().feature_names
+    if feature_names is not None and list(features.columns) != feature_names:
+        raise ValueError(
+            f"Features {list(features.columns)} do not match the model's {feature_names}"
+        )
+    matrix = np.ascontiguousarray(features.to_numpy(dtype=np.float32))
+    return list(_get_executor().map(lambda reg: _predict(reg, matrix), regs))
+
+
+# Weighted average of the ensemble's predictions (plain average without weights)
+def ensemble_predict(regs: list, features: pd.DataFrame, weights=None) -> np.ndarray:
+    predictions = predict_all(regs, features)
+    sum = np.zeros(features.shape[0])
+    if weights is None:
+        for prediction in predictions:
+            sum += prediction
+        return sum / len(regs)
+    for weight, prediction in zip(weights, predictions):
+        sum += weight * prediction
+    return sum / np.sum(weights)
@@ -25,16 +25,11 @@ def preds_to_net_load_dict(
     pv_model="XGBoost_pv_v1",
     load_model="XGBoost_load_v4",
 ) -> dict:  
-    values = []
-    for _, row in df.iterrows():
-        values.append(
-            {
-                "Timestamp": row["datetime"],
-                "PV": row["pv_pred"],
-                "Load": row["load_pred"],
-                "Net-Load": row["net_load"],
-            }
-        )
+    values = (
+        df[["datetime", "pv_pred", "load_pred", "net_load"]]
+        .set_axis(["Timestamp", "PV", "Load", "Net-Load"], axis=1)
+        .to_dict("records")
+    )
 
     net_load_dict = {
         "Grid": "UCY Microgrid",
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import math
 import logging
@@ -11,6 +12,8 @@ environ.Env.read_env(env_file='././foss_nanogrid/.env')
 XWEATHER_CLIENT_ID = env("XWEATHER_CLIENT_ID")
 XWEATHER_CLIENT_SECRET = env("XWEATHER_CLIENT_SECRET")
 XWEATHER_BASE_URL = "https://api.aerisapi.com/"  # Different from one in data_collection (for batch feature)
+MAX_BATCH_REQUESTS = 31  # Xweather limit on individual requests in one batch call
+XWEATHER_TIMEOUT = 30  # seconds
 
 # Make batch (requests) param for API call (signifigantly reduces number of calls to API)
 def get_weather_data_batch(start: pd.Timestamp, end: pd.Timestamp, longitude, latitude, resolution, min_resolution: bool) -> pd.DataFrame | bool:    
@@ -62,4 +65,113 @@ def get_weather_data_batch(start: pd.Timestamp, end: pd.Timestamp, longitude, la
         log.error(f'Failed to get weather data for Long: {longitude}, Lat: {latitude}, Error: {e}')
         return False
     
-    return response_data
\ No newline at end of file
+    return response_data
+
+# Get conditions for many locations over the same time range with as few batch calls as possible
+# locations: list of (latitude, longitude); returns list of individual responses (False if failed) in order
+def get_conditions_batch(locations: list, start, end, resolution: str = "10min") -> list:
+    results = []
+    for i in range(0, len(locations), MAX_BATCH_REQUESTS):
+        chunk = locations[i : i + MAX_BATCH_REQUESTS]
+        requests_param = ",".join(
+            f"/conditions/{latitude},{longitude}%3Ffrom={start}%26to={end}"
+            for latitude, longitude in chunk
+        )
+        params = {
+            "format": "json",
+            "filter": resolution,
+            "client_id": XWEATHER_CLIENT_ID,
+            "client_secret": XWEATHER_CLIENT_SECRET,
+            "requests": requests_param,
+        }
+
+        try:
+            response = requests.get(
+                f"{XWEATHER_BASE_URL}/batch", params=params, timeout=XWEATHER_TIMEOUT
+            )
+            if response.status_code != 200:
+                log.error(
+                    f"Failed to get batched conditions for {len(chunk)} locations, Status: {response.status_code}"
+                )
+                results += [False] * len(chunk)
+                continue
+            response_data = response.json()
+            if response_data["success"] != True:
+                log.error(
+                    f"Error in batched conditions response, Recieved error: {response_data['error']}"
+                )
+                results += [False] * len(chunk)
+                continue
+        except Exception as e:
+            log.error(f"Failed to get batched conditions for {len(chunk)} locations, Error: {e}")
+            results += [False] * len(chunk)
+            continue
+
+        responses = response_data["response"]["responses"]
+        responses += [{"success": False, "error": "missing response"}] * (
+            len(chunk) - len(responses)
+        )
+        failed = [
+            f"{location}: {individual_response.get('error')}"
+            for location, individual_response in zip(chunk, responses)
+            if individual_response["success"] != True
+        ]
+        if failed:
+            log.error(f"Failed individual conditions responses: {failed}")
+        results += [
+            individual_response if individual_response["success"] == True else False
+            for individual_response in responses
+        ]
+    return results
+
+# Flatten the periods of a get_weather_data_batch response into one columnar DataFrame
+# columns: {column name: period key, nested keys joined by '.' (e.g. 'solrad.ghiWM2')}
+# Failed individual responses are logged together; returns False if the batch call failed
+def weather_batch_to_frame(response_data, columns: dict, name: str) -> pd.DataFrame | bool:
+    if not isinstance(response_data, dict):
+        return False
+
+    responses = response_data["response"]["responses"]
+    failed = [
+        f"{i}: {individual_response.get('error')}"
+        for i, individual_response in enumerate(responses)
+        if individual_response["success"] != True
+    ]
+    if failed:
+        log.error(f"Failed {len(failed)} of {len(responses)} individual responses for {name}, Recieved errors: {failed}")
+
+    periods = [
+        period
+        for individual_response in responses
+        if individual_response["success"] == True
+        for period in individual_response["response"][0]["periods"]
+    ]
+
+    # one list comprehension per column and nesting level instead of appends per value;
+    # numeric columns become float arrays (None -> NaN) so pandas skips type inference
+    data = {}
+    for column, path in columns.items():
+        values = periods
+        for key in path.split("."):
+            values = [value[key] for value in values]
+        try:
+            data[column] = np.array(values, dtype=np.float64) if values else values
+        except (TypeError, ValueError):
+            data[column] = values
+    return pd.DataFrame(data)
+
+
+# Datetimes of Xweather ISO strings ('2024-06-13T10:00:00+03:00'): the local wall time, or UTC
+# with utc=True. Parses the fixed layout in C instead of pd.to_datetime's slow per-element
+# offset handling, which also keeps working when the offset changes within the range (DST)
+def parse_xweather_times(values: pd.Series, utc: bool = False) -> pd.Series:
+    if values.empty or not (values.str.len() == 25).all():
+        return pd.to_datetime(values, utc=True) if utc else pd.to_datetime(values).dt.tz_localize(None)
+
+    times = pd.to_datetime(values.str[:19], format="%Y-%m-%dT%H:%M:%S")
+    if not utc:
+        return times
+    offset = values.str[19:]
+    minutes = offset.str[1:3].astype(int) * 60 + offset.str[4:6].astype(int)
+    minutes = minutes.where(offset.str[0] != "-", -minutes)
+    return (times - pd.to_timedelta(minutes, unit="min")).dt.tz_localize("UTC")
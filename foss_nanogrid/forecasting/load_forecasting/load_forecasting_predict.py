@@ -2,7 +2,12 @@ import numpy as np
 import pandas as pd
 import xgboost as xgb
 import logging
-from ..helper_functions.weather_api import get_weather_data_batch
+from ..helper_functions.ensemble import ensemble_predict
+from ..helper_functions.weather_api import (
+    get_weather_data_batch,
+    parse_xweather_times,
+    weather_batch_to_frame,
+)
 from data_collection.models import SmartMeter
 
 log = logging.getLogger(__name__)
@@ -72,34 +77,20 @@ class LoadPredict:
         )
 
         # Create dataframe from API batched responses
-        datetime = []
-        tamb_series = []
-        rh_series = []
-        precip_series = []
-        ghi_series = []  # in WM2
-        for individual_response in response_data["response"]["responses"]:
-            if individual_response["success"] == True:
-                for period in individual_response["response"][0]["periods"]:
-                    tamb_series.append(period["tempC"])
-                    rh_series.append(period["humidity"])
-                    precip_series.append(period["precipMM"])
-                    ghi_series.append(period["solrad"]["ghiWM2"])
-                    datetime.append(period["dateTimeISO"])  # ALTERNATIVE IS ValidTime?
-            else:
-                log.error(
-                    f"Error in individual response for {sm.field_name}, Recieved error: {individual_response['error']}"
-                )
-
-        df = pd.DataFrame(
+        df = weather_batch_to_frame(
+            response_data,
             {
-                "datetime": datetime,
-                "Tamb-temp": tamb_series,
-                "humidity": rh_series,
-                "precipMM": precip_series,
-                "GHI-GhPyr": ghi_series,
-            }
+                "datetime": "dateTimeISO",  # ALTERNATIVE IS ValidTime?
+                "Tamb-temp": "tempC",
+                "humidity": "humidity",
+                "precipMM": "precipMM",
+                "GHI-GhPyr": "solrad.ghiWM2",  # in WM2
+            },
+            sm.field_name,
         )
-        df["datetime"] = pd.to_datetime(df["datetime"], utc=True)
+        if not isinstance(df, pd.DataFrame):
+            return False
+        df["datetime"] = parse_xweather_times(df["datetime"], utc=True)
 
         return df
 
@@ -134,11 +125,7 @@ class LoadPredict:
             input_features.shape[1] == NUM_OF_FEATURES
         ), f"Input features must have {NUM_OF_FEATURES} columns"
 
-        sum = np.zeros(input_features.shape[0])
-        for reg in self.regs:
-            sum += reg.predict(input_features)
-
-        return sum / len(self.regs)
+        return ensemble_predict(self.regs, input_features)
 
     # Forecast load Power for range between start and end with minute resolution of resolution
     def forecast_load_timestamp_range(
@@ -168,20 +155,19 @@ class LoadPredict:
         return pd.DataFrame({"datetime": datetime_col, "load_pred": predictions})
 
     # Take predictions data from (columns: datetime, load_pred) and creates json file in SolarCast format
-    # **kwargs: sm - SmartMeter object, date_run - date the forecast model was run
+    # sm - SmartMeter the load was forecast for, resolved once by the caller
+    # **kwargs: date_run - date the forecast model was run
     @staticmethod
     def forecasted_power_to_dict(
-        _predictions: pd.DataFrame, model="XGBoost_load_v4", **kwargs
+        _predictions: pd.DataFrame, sm: SmartMeter, model="XGBoost_load_v4", **kwargs
     ) -> dict:
-        predictions = _predictions.sort_values(by="datetime").copy()
-        values = []
-        if "sm" in kwargs:
-            sm = SmartMeter.objects.get(field_name=kwargs["sm"])
-        else:
-            sm = SmartMeter.objects.get(field_name="EC_SM2")
+        predictions = _predictions.sort_values(by="datetime")
 
-        for _, row in predictions.iterrows():
-            values.append({"Timestamp": row["datetime"], "kW": row["load_pred"]})
+        values = (
+            predictions[["datetime", "load_pred"]]
+            .set_axis(["Timestamp", "kW"], axis=1)
+            .to_dict("records")
+        )
 
         if len(values) >= 1:
             forecast_dict = {
@@ -0,0 +1,101 @@
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+
+from forecasting.helper_functions.ensemble import ensemble_predict
+from forecasting.load_forecasting.load_forecasting_predict import LoadPredict
+from forecasting.pv_forecasting.pv_forecasting_predict import MODEL_ACC_WEIGHTS, PVPredict
+
+"""
+Latency benchmark of the PV and load ensembles: the sequential loop of
+XGBRegressor.predict calls on the DataFrame (the previous implementation) against
+ensemble_predict (one float32 matrix, inplace_predict, members in a thread pool).
+Features are random values in the models' input ranges; both paths must give the same
+predictions, which is checked for every size.
+Start with: python manage.py bench_forecast_ensemble [--rows 48 336 1440] [--repeat 50]
+"""
+
+# Feature columns and (low, high) of the random values
+PV_FEATURES = {
+    "min": (0, 1440),
+    "month": (1, 13),
+    "dayofyear": (1, 366),
+    "weekofyear": (1, 53),
+    "quarter": (1, 5),
+    "Tamb": (0, 40),
+    "RH": (10, 100),
+    "POA": (0, 1000),
+}
+LOAD_FEATURES = {
+    "minute": (0, 1440),
+    "day_of_week": (0, 7),
+    "day_of_year": (1, 366),
+    "month": (1, 13),
+    "Tamb-temp": (0, 40),
+    "humidity": (10, 100),
+    "precipMM": (0, 5),
+    "GHI-GhPyr": (0, 1000),
+}
+
+
+# Sequential ensemble as implemented before ensemble_predict
+def _sequential(regs, features, weights=None):
+    sum = np.zeros(features.shape[0])
+    for i, reg in enumerate(regs):
+        sum += (1 if weights is None else weights[i]) * reg.predict(features)
+    return sum / (len(regs) if weights is None else np.sum(weights))
+
+
+class Command(BaseCommand):
+    help = "Time the sequential and batched forecasting ensembles"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            type=int,
+            nargs="+",
+            default=[48, 336, 1440],
+            help="Feature rows per prediction (48 = one day at 30 minute resolution)",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=50, help="Runs per case (median is reported)"
+        )
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        ensembles = [
+            ("pv", PVPredict().regs, PV_FEATURES, MODEL_ACC_WEIGHTS),
+            ("load", LoadPredict().regs, LOAD_FEATURES, None),
+        ]
+        self.stdout.write(
+            f"{'model':>6} {'rows':>6} {'loop ms':>9} {'batched ms':>11} {'speedup':>8}"
+        )
+        for name, regs, columns, weights in ensembles:
+            for rows in options["rows"]:
+                features = pd.DataFrame(
+                    {
+                        column: rng.uniform(low, high, rows)
+                        for column, (low, high) in columns.items()
+                    }
+                )
+                loop = lambda: _sequential(regs, features, weights)
+                batched = lambda: ensemble_predict(regs, features, weights)
+                if not np.array_equal(loop(), batched()):
+                    self.stderr.write(f"{name} predictions differ for {rows} rows")
+                loop_ms = self._median_ms(loop, options["repeat"])
+                batched_ms = self._median_ms(batched, options["repeat"])
+                self.stdout.write(
+                    f"{name:>6} {rows:>6} {loop_ms:>9.3f} {batched_ms:>11.3f} "
+                    f"{loop_ms / batched_ms:>7.2f}x"
+                )
+
+    def _median_ms(self, function, repeat) -> float:
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            runs.append((time.perf_counter() - start) * 1000)
+        return statistics.median(runs)
@@ -3,8 +3,13 @@ import pandas as pd
 import xgboost as xgb
 import logging
 import environ
-from ..helper_functions.calc_poa import calculate_poa_irradiance
-from ..helper_functions.weather_api import get_weather_data_batch
+from ..helper_functions.calc_poa import calculate_poa_irradiance_array
+from ..helper_functions.ensemble import ensemble_predict
+from ..helper_functions.weather_api import (
+    get_weather_data_batch,
+    parse_xweather_times,
+    weather_batch_to_frame,
+)
 from ..models import PVPanel
 
 log = logging.getLogger(__name__)
@@ -87,42 +92,31 @@ class PVPredict:
         )
 
         # Create dataframe from API batched responses
-        datetime = []
-        tamb_series = []
-        rh_series = []
-        poa_series = []
-        for individual_response in response_data["response"]["responses"]:
-            if individual_response["success"] == True:
-                for period in individual_response["response"][0]["periods"]:
-                    tamb_series.append(period["tempC"])
-                    rh_series.append(period["humidity"])
-                    poa_series.append(
-                        calculate_poa_irradiance(
-                            solar_zenith=period["solrad"]["zenithDEG"],
-                            ghi=period["solrad"]["ghiWM2"],
-                            inclination=pv.inclination,
-                            solar_azimuth=period["solrad"]["azimuthDEG"],
-                            site_azimuth=pv.azimuth,
-                        )
-                    )
-                    datetime.append(period["dateTimeISO"])  # ALTERNATIVE IS ValidTime?
-
-            else:
-                log.error(
-                    f"Error in individual response for {pv.name}, Recieved error: {individual_response['error']}"
-                )
-
-        df = pd.DataFrame(
+        df = weather_batch_to_frame(
+            response_data,
             {
-                "datetime": datetime,
-                "Tamb": tamb_series,
-                "RH": rh_series,
-                "POA": poa_series,
-            }
+                "datetime": "dateTimeISO",  # ALTERNATIVE IS ValidTime?
+                "Tamb": "tempC",
+                "RH": "humidity",
+                "zenith": "solrad.zenithDEG",
+                "ghi": "solrad.ghiWM2",  # in WM2
+                "azimuth": "solrad.azimuthDEG",
+            },
+            pv.name,
         )
-        df["datetime"] = pd.to_datetime(df["datetime"]).dt.tz_localize(None)
+        if not isinstance(df, pd.DataFrame):
+            return False
 
-        return df
+        df["POA"] = calculate_poa_irradiance_array(
+            solar_zenith=df["zenith"],
+            ghi=df["ghi"],
+            inclination=pv.inclination,
+            solar_azimuth=df["azimuth"],
+            site_azimuth=pv.azimuth,
+        )
+        df["datetime"] = parse_xweather_times(df["datetime"])
+
+        return df[["datetime", "Tamb", "RH", "POA"]]
 
     # Create time features from a dataframe with a datetime column
     def _create_time_features(self, _df) -> pd.DataFrame:
@@ -150,11 +144,7 @@ class PVPredict:
         if not all_models:
             return self.regs[1].predict(input_features)
         else:
-            sum = np.zeros(input_features.shape[0])
-            for i, reg in enumerate(self.regs):
-                sum += MODEL_ACC_WEIGHTS[i] * reg.predict(input_features)
-
-            return sum / np.sum(MODEL_ACC_WEIGHTS)
+            return ensemble_predict(self.regs, input_features, MODEL_ACC_WEIGHTS)
 
     # Forecast PV Power Output for range between start and end with minute resolution of resolution
     def forecast_pv_timestamp_range(
@@ -193,10 +183,12 @@ class PVPredict:
     def forecasted_power_to_dict(
         _predictions: pd.DataFrame, model="XGBoost_pv_v1", **kwargs
     ) -> dict:
-        predictions = _predictions.sort_values(by="datetime").copy()
-        values = []
-        for index, row in predictions.iterrows():
-            values.append({"Timestamp": row["datetime"], "MW": row["pv_pred"]})
+        predictions = _predictions.sort_values(by="datetime")
+        values = (
+            predictions[["datetime", "pv_pred"]]
+            .set_axis(["Timestamp", "MW"], axis=1)
+            .to_dict("records")
+        )
 
         if "pv" in kwargs and len(values) >= 1:
             forecast_dict = {
@@ -0,0 +1,50 @@
+import logging
+import threading
+import time
+
+from .load_forecasting.load_forecasting_predict import LoadPredict
+from .pv_forecasting.pv_forecasting_predict import PVPredict
+
+log = logging.getLogger(__name__)
+
+"""
+Process-wide registry of forecasting predictors. Loading the XGBoost boosters from disk
+(6 PV and 5 load models) is far slower than a prediction, so each predictor class is
+built once per process, on first use or at startup when FORECAST_MODELS_WARM_UP is set
+(see ForecastingConfig.ready), and shared by all requests and threads. Predictors keep
+no per-request state and XGBoost prediction is thread-safe, so no locking is needed
+after construction.
+"""
+
+_predictors = {}
+_lock = threading.Lock()
+
+
+# Shared instance of a predictor class; the first caller builds it while others wait
+def get_predictor(predictor_class):
+    predictor = _predictors.get(predictor_class)
+    if predictor is None:
+        with _lock:
+            predictor = _predictors.get(predictor_class)
+            if predictor is None:
+                start = time.perf_counter()
+                predictor = predictor_class()
+                _predictors[predictor_class] = predictor
+                log.info(
+                    f"Loaded {predictor_class.__name__} models in {time.perf_counter() - start:.2f}s"
+                )
+    return predictor
+
+
+def get_pv_predictor() -> PVPredict:
+    return get_predictor(PVPredict)
+
+
+def get_load_predictor() -> LoadPredict:
+    return get_predictor(LoadPredict)
+
+
+# Load every predictor now instead of on the first request
+def warm_up():
+    get_pv_predictor()
+    get_load_predictor()
@@ -11,6 +11,7 @@ import pandas as pd
 import numpy as np
 from .models import PVPanel, Prediction
 from .pv_forecasting.pv_forecasting_predict import PVPredict
+from .registry import get_pv_predictor
 import logging
 import json
 
@@ -45,8 +46,8 @@ def forecast_pv_timestamp_range(
 def _forecast_and_store_tomorrow_pvs():
     # Get all PV panels
     pvs = PVPanel.objects.all()
-    # Create a predictor
-    predictor = PVPredict()
+    # Shared predictor
+    predictor = get_pv_predictor()
     # Get tomorrow's date
     tomorrow = pd.Timestamp.now().date() + pd.Timedelta(days=1)
     # Get the start and end of tomorrow
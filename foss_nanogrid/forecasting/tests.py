@@ -1,7 +1,25 @@
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 from django.test import TestCase
 import pandas as pd
-from .pv_forecasting.pv_forecasting_predict import PVPredict
+import re
+import requests
+from data_collection.models import SmartMeter
+from .helper_functions.calc_poa import (
+    calculate_poa_irradiance,
+    calculate_poa_irradiance_array,
+)
+from .helper_functions.net_load import preds_to_net_load_dict
+from .helper_functions.weather_api import (
+    MAX_BATCH_REQUESTS,
+    get_conditions_batch,
+    parse_xweather_times,
+    weather_batch_to_frame,
+)
+from .load_forecasting.load_forecasting_predict import LoadPredict
+from .pv_forecasting.pv_forecasting_predict import MODEL_ACC_WEIGHTS, PVPredict
+from .registry import get_predictor, get_pv_predictor
 
 
 # Create your tests here.
@@ -15,5 +33,218 @@ class ForecastingTestCase(TestCase):
     # Test the forecast_pv function
     def test_forecast_pv(self):
         pv_predictor = PVPredict()
-        predictions = pv_predictor._forecast_pv(self.df_features)
-        self.assertTrue(np.array_equal(self.correct_preds, predictions))
+        predictions = pv_predictor._forecast_pv(self.df_features, True)
+        # the stored reference matches to float rounding (about 1e-8), not bit for bit
+        self.assertTrue(np.allclose(self.correct_preds, predictions))
+
+    # The batched ensemble gives exactly the result of predicting member by member
+    def test_ensemble_matches_sequential_predict(self):
+        pv_predictor = PVPredict()
+        expected = np.zeros(len(self.df_features))
+        for weight, reg in zip(MODEL_ACC_WEIGHTS, pv_predictor.regs):
+            expected += weight * reg.predict(self.df_features)
+        expected /= np.sum(MODEL_ACC_WEIGHTS)
+        self.assertTrue(
+            np.array_equal(pv_predictor._forecast_pv(self.df_features, True), expected)
+        )
+        # members are fed by column position, so another column order is refused
+        reordered = self.df_features[self.df_features.columns[::-1]]
+        with self.assertRaises(ValueError):
+            pv_predictor._forecast_pv(reordered, True)
+
+        load_predictor = LoadPredict()
+        load_features = pd.DataFrame(
+            self.df_features.to_numpy(),
+            columns=[
+                "minute",
+                "day_of_week",
+                "day_of_year",
+                "month",
+                "Tamb-temp",
+                "humidity",
+                "precipMM",
+                "GHI-GhPyr",
+            ],
+        )
+        expected = np.zeros(len(load_features))
+        for reg in load_predictor.regs:
+            expected += reg.predict(load_features)
+        expected /= len(load_predictor.regs)
+        self.assertTrue(
+            np.array_equal(load_predictor._forecast_load(load_features), expected)
+        )
+
+    # The array POA matches the scalar one and is 0 with the sun at or below the horizon
+    def test_poa_array_matches_scalar(self):
+        zenith, azimuth = np.meshgrid(np.arange(0.5, 180, 7.25), np.arange(0, 360, 15))
+        zenith, azimuth = zenith.ravel(), azimuth.ravel()
+        ghi = np.linspace(0, 1000, len(zenith))
+        poa = calculate_poa_irradiance_array(zenith, ghi, 30, azimuth, 180)
+        expected = [
+            calculate_poa_irradiance(z, g, 30, a, 180)
+            for z, g, a in zip(zenith, ghi, azimuth)
+        ]
+        self.assertTrue(np.array_equal(poa, expected))
+        self.assertTrue((poa[zenith > 90] == 0).all())
+
+        with np.errstate(all="raise"):
+            poa = calculate_poa_irradiance_array([90.0, 120.0], [50.0, 50.0], 30, 0, 180)
+        self.assertEqual(poa.tolist(), [0, 0])
+
+    # Locations are split into batch calls of MAX_BATCH_REQUESTS; results stay in order
+    def test_get_conditions_batch(self):
+        def response(url, params, timeout):
+            requested = re.findall(r"/conditions/([^%]+)%3F", params["requests"])
+            responses = [
+                {"success": True, "response": [{"periods": [], "location": location}]}
+                for location in requested
+            ]
+            responses[0] = {"success": False, "error": {"code": "invalid_location"}}
+            if len(requested) < MAX_BATCH_REQUESTS:
+                responses.pop()  # the last batch answers one request short
+            batch = mock.Mock(status_code=200)
+            batch.json.return_value = {
+                "success": True,
+                "response": {"responses": responses},
+            }
+            return batch
+
+        locations = [(35 + i / 100, 33.0) for i in range(35)]
+        with mock.patch(
+            "forecasting.helper_functions.weather_api.requests.get", side_effect=response
+        ) as get:
+            results = get_conditions_batch(locations, start="a", end="b")
+        batch_sizes = [
+            call.kwargs["params"]["requests"].count("/conditions/")
+            for call in get.call_args_list
+        ]
+        self.assertEqual(batch_sizes, [MAX_BATCH_REQUESTS, 35 - MAX_BATCH_REQUESTS])
+        self.assertEqual(len(results), 35)
+        # failed and missing individual responses are False, the rest keep their location
+        self.assertEqual(
+            [i for i, result in enumerate(results) if not result],
+            [0, MAX_BATCH_REQUESTS, 34],
+        )
+        for (latitude, longitude), result in zip(locations, results):
+            if result:
+                location = result["response"][0]["location"]
+                self.assertEqual(location, f"{latitude},{longitude}")
+
+    # A failed batch call fails every location of that call
+    def test_get_conditions_batch_failed_call(self):
+        with mock.patch(
+            "forecasting.helper_functions.weather_api.requests.get",
+            return_value=mock.Mock(status_code=500),
+        ):
+            results = get_conditions_batch([(35.0, 33.0), (35.1, 33.1)], "a", "b")
+        self.assertEqual(results, [False, False])
+
+        with mock.patch(
+            "forecasting.helper_functions.weather_api.requests.get",
+            side_effect=requests.Timeout,
+        ):
+            results = get_conditions_batch([(35.0, 33.0)], "a", "b")
+        self.assertEqual(results, [False])
+
+    # Batch responses are flattened in order and failed individual responses logged once
+    def test_weather_batch_to_frame(self):
+        def period(hour, ghi):
+            return {
+                "dateTimeISO": f"2024-06-13T{hour:02d}:00:00+03:00",
+                "tempC": 20 + hour,
+                "solrad": {"ghiWM2": ghi},
+            }
+
+        response_data = {
+            "response": {
+                "responses": [
+                    {"success": True, "response": [{"periods": [period(0, 0), period(1, 10)]}]},
+                    {"success": False, "error": {"code": "invalid_location"}},
+                    {"success": True, "response": [{"periods": [period(2, 20)]}]},
+                ]
+            }
+        }
+        columns = {"datetime": "dateTimeISO", "Tamb": "tempC", "ghi": "solrad.ghiWM2"}
+        with self.assertLogs("forecasting.helper_functions.weather_api", "ERROR") as logs:
+            df = weather_batch_to_frame(response_data, columns, "test-pv")
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("invalid_location", logs.output[0])
+        self.assertEqual(list(df.columns), ["datetime", "Tamb", "ghi"])
+        self.assertEqual(df["Tamb"].tolist(), [20, 21, 22])
+        self.assertEqual(df["ghi"].tolist(), [0, 10, 20])
+
+        self.assertFalse(weather_batch_to_frame(False, columns, "test-pv"))
+
+    # Fast timestamp parsing agrees with pandas, also across a DST change
+    def test_parse_xweather_times(self):
+        values = pd.Series(
+            ["2024-10-27T02:30:00+03:00", "2024-10-27T03:30:00+02:00", "2024-01-01T00:00:00-05:30"]
+        )
+        expected = [pd.Timestamp(value) for value in values]
+        self.assertEqual(
+            parse_xweather_times(values, utc=True).tolist(),
+            [timestamp.tz_convert("UTC") for timestamp in expected],
+        )
+        self.assertEqual(
+            parse_xweather_times(values).tolist(),
+            [timestamp.tz_localize(None) for timestamp in expected],
+        )
+
+    # Forecast values are serialized in time order with the same keys and values per point
+    def test_forecasted_power_to_dict(self):
+        predictions = pd.DataFrame(
+            {
+                "datetime": pd.date_range(
+                    "2024-06-13 10:00", periods=3, freq="30min", tz="Asia/Nicosia"
+                )[::-1],
+                "pv_pred": [0.3, 0.2, 0.1],
+            }
+        )
+        forecast = PVPredict.forecasted_power_to_dict(predictions)
+        self.assertEqual(
+            forecast["values"],
+            [
+                {"Timestamp": pd.Timestamp("2024-06-13 10:00", tz="Asia/Nicosia"), "MW": 0.1},
+                {"Timestamp": pd.Timestamp("2024-06-13 10:30", tz="Asia/Nicosia"), "MW": 0.2},
+                {"Timestamp": pd.Timestamp("2024-06-13 11:00", tz="Asia/Nicosia"), "MW": 0.3},
+            ],
+        )
+
+        # the load forecast uses the smart meter it is given, without querying it
+        sm = SmartMeter(field_name="EC_SM2", latitude=35.1, longitude=33.4)
+        load = predictions.rename(columns={"pv_pred": "load_pred"})
+        with self.assertNumQueries(0):
+            forecast = LoadPredict.forecasted_power_to_dict(load, sm=sm)
+        self.assertEqual(forecast["Reference SM"], "EC_SM2")
+        self.assertEqual([v["kW"] for v in forecast["values"]], [0.1, 0.2, 0.3])
+
+        net_load = predictions.sort_values("datetime").assign(load_pred=1.0)
+        net_load["net_load"] = net_load["load_pred"] - net_load["pv_pred"]
+        net_load_dict = preds_to_net_load_dict(net_load, "EC_SM2", "future-ucy-pv", 35.1, 33.4)
+        self.assertEqual(
+            list(net_load_dict["values"][0]), ["Timestamp", "PV", "Load", "Net-Load"]
+        )
+        self.assertEqual(net_load_dict["values"][0]["Net-Load"], 0.9)
+        self.assertEqual(
+            net_load_dict["forecasted_dates"],
+            "2024-06-13 10:00:00+03:00 to 2024-06-13 11:00:00+03:00",
+        )
+
+    # Predictors are built once per process and shared, also between threads
+    def test_predictor_registry(self):
+        # restore the process-wide registry afterwards so no test predictor leaks out
+        patcher = mock.patch.dict("forecasting.registry._predictors")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        class CountingPredictor:
+            built = 0
+
+            def __init__(self):
+                CountingPredictor.built += 1
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            predictors = list(pool.map(lambda _: get_predictor(CountingPredictor), range(32)))
+        self.assertEqual(CountingPredictor.built, 1)
+        self.assertTrue(all(p is predictors[0] for p in predictors))
+        self.assertIs(get_pv_predictor(), get_pv_predictor())
@@ -1,8 +1,9 @@
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, renderer_classes
 
 from data_collection.models import SmartMeter
+from foss_nanogrid.renderers import COLUMNAR_RENDERERS
 from .helper_functions.net_load import calc_net_load, preds_to_net_load_dict
 from .helper_functions.views_helper import (
     start_end_time_valid,
@@ -11,6 +12,7 @@ from .helper_functions.views_helper import (
 )
 from .load_forecasting.load_forecasting_predict import LoadPredict
 from .pv_forecasting.pv_forecasting_predict import PVPredict
+from .registry import get_load_predictor, get_pv_predictor
 from .models import PVPanel
 import pandas as pd
 import logging
@@ -21,11 +23,12 @@ log = logging.getLogger(__name__)
 # Create your views here.
 # Must request with paramgs start, end, and pv. Optional params are resolution, min_resolution, and all_models
 @api_view(["GET"])
+@renderer_classes(COLUMNAR_RENDERERS)
 def forecast_pv(request):
     if not request.method == "GET":
         log.info("Invalid info/ request. {request.method} instead of GET")
 
-    predictor = PVPredict()
+    predictor = get_pv_predictor()
 
     # Get query params
     if (
@@ -83,11 +86,12 @@ def forecast_pv(request):
 # Use forecasting model to forecast load for UCY Microgrid in param specified range
 # Must request with params start, end. Optional params are resolution and min_resolution
 @api_view(["GET"])
+@renderer_classes(COLUMNAR_RENDERERS)
 def forecast_ucy_load(request):
     if not request.method == "GET":
         log.info("Invalid info/ request. {request.method} instead of GET")
 
-    predictor = LoadPredict()
+    predictor = get_load_predictor()
 
     # Get query params
     if not "start" in request.query_params or not "end" in request.query_params:
@@ -118,12 +122,13 @@ def forecast_ucy_load(request):
         log.info("Failure in forecast_pv_timestamp_range")
         return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    predictions_json = LoadPredict.forecasted_power_to_dict(predictions)
+    predictions_json = LoadPredict.forecasted_power_to_dict(predictions, sm=sm)
     return Response(predictions_json, status=status.HTTP_200_OK)
 
 
 # Use PV and load to forecast net load for UCY microgrid in param specified range
 @api_view(["GET"])
+@renderer_classes(COLUMNAR_RENDERERS)
 def forecast_net_load(request):
     if not request.method == "GET":
         log.info("Invalid info/ request. {request.method} instead of GET")
@@ -173,8 +178,8 @@ def forecast_net_load(request):
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
     # Predict production and load
-    pv_predictor = PVPredict()
-    load_predictor = LoadPredict()
+    pv_predictor = get_pv_predictor()
+    load_predictor = get_load_predictor()
     pv_predictions = pv_predictor.forecast_pv_timestamp_range(
         start=start,
         end=end,
@@ -0,0 +1,100 @@
+import datetime
+
+import msgpack
+import orjson
+import pandas as pd
+from rest_framework.renderers import BaseRenderer, BrowsableAPIRenderer, JSONRenderer
+from rest_framework.utils import encoders
+
+"""
+Columnar response layout for the forecasting and metrics APIs. Lists of per-timestamp
+(or per-meter) dicts, either the whole payload or its "values", are turned into one array
+per key, e.g. {"Timestamp": [...], "MW": [...]}, so field names are sent once instead of
+on every point. Chosen through DRF content negotiation: ?format=columnar or
+Accept: application/vnd.nanogrid.columnar+json, and ?format=msgpack or
+Accept: application/x-msgpack. JSON stays the default.
+JSON (both layouts) is encoded with orjson; values it has no native type for
+(pd.Timestamp, datetimes, Decimal, numpy scalars) still go through DRF's encoder, so
+strings are the same as JSONRenderer's. Floats may be written in another but exact
+notation (1e-05 as 0.00001) and NaN renders as null instead of raising.
+"""
+
+_drf_default = encoders.JSONEncoder().default
+
+
+# DRF's conversion of the types orjson passes through or does not know. pd.Timestamp goes
+# through the C datetime.isoformat, which gives the same string unless it has nanoseconds
+def _default(obj):
+    if isinstance(obj, pd.Timestamp) and not obj.nanosecond:
+        representation = datetime.datetime.isoformat(obj)
+        if representation.endswith("+00:00"):
+            representation = representation[:-6] + "Z"
+        return representation
+    return _drf_default(obj)
+
+
+# One list per key of a list of dicts; keys in first-seen order, missing values are None
+def _columns(records: list) -> dict:
+    keys = dict.fromkeys(key for record in records for key in record)
+    return {key: [record.get(key) for record in records] for key in keys}
+
+
+# Columnar version of a response payload; payloads without records are returned as is
+def to_columnar(data):
+    if isinstance(data, list) and all(isinstance(item, dict) for item in data):
+        return _columns(data)
+    if isinstance(data, dict) and isinstance(data.get("values"), list):
+        return dict(data, values=_columns(data["values"]))
+    return data
+
+
+# JSONRenderer with orjson encoding; falls back to JSONRenderer for indented output or
+# ASCII-only settings, which orjson does not support
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(
+            data,
+            default=_default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+        )
+        # same escaping of line separators as JSONRenderer (valid JSON, not valid JavaScript)
+        return ret.replace("\u2028".encode(), b"\\u2028").replace(
+            "\u2029".encode(), b"\\u2029"
+        )
+
+
+class ColumnarJSONRenderer(FastJSONRenderer):
+    media_type = "application/vnd.nanogrid.columnar+json"
+    format = "columnar"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(to_columnar(data), accepted_media_type, renderer_context)
+
+
+class ColumnarMsgPackRenderer(BaseRenderer):
+    media_type = "application/x-msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        # same conversions as the JSON output (ISO timestamps, floats for decimals, ...)
+        return msgpack.packb(to_columnar(data), default=encoders.JSONEncoder().default)
+
+
+# Renderers for views offering the columnar layout; DRF's defaults stay first
+COLUMNAR_RENDERERS = [
+    FastJSONRenderer,
+    BrowsableAPIRenderer,
+    ColumnarJSONRenderer,
+    ColumnarMsgPackRenderer,
+]
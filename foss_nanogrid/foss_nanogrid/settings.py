@@ -101,6 +101,18 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Shared between the web server and the pollers; create the table with: python manage.py createcachetable
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "django_cache",
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -194,6 +206,11 @@ CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
 CELERY_TIMEZONE = "UTC"
 
 TASK_QUEUE_NAME = "foss_nanogrid_queue"  # change accordingly as you have <Queue_Name>
+# smart meter polling runs on its own queue, consumed by a single worker process
+# (--concurrency=1, see run_foss_nanogrid_webapp.zsh): the Modbus connection pool and the
+# meter circuit breakers live in the memory of the polling process
+SM_POLL_QUEUE_NAME = env.str("SM_POLL_QUEUE_NAME", default="foss_nanogrid_sm_poll_queue")
+CELERY_TASK_ROUTES = {"data_collection.tasks.get_all_sm_data": {"queue": SM_POLL_QUEUE_NAME}}
 
 # make celery use json strictly
 CELERY_ACCEPT_CONTENT = ["json"]
@@ -205,3 +222,23 @@ CELERY_CONTENT_ENCODING = "utf-8"
 AWS_ACCESS_KEY_ID = env("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = env("AWS_SECRET_ACCESS_KEY")
 AWS_DEFAULT_REGION = "eu-north-1"
+
+# Data collection configurations
+SM_POLL_MAX_CONCURRENCY = env.int("SM_POLL_MAX_CONCURRENCY", default=32)  # meters read at once per sweep
+SM_REGISTER_MAX_GAP = env.int("SM_REGISTER_MAX_GAP", default=40)  # unused registers allowed inside one block read
+SM_POLL_INTERVAL = env.float("SM_POLL_INTERVAL", default=10.0)  # seconds; used by the collect_sm_data command
+WEATHER_GRID_DECIMALS = env.int("WEATHER_GRID_DECIMALS", default=2)  # lat/long rounding for shared weather requests
+RT_PRUNE_BATCH_SIZE = env.int("RT_PRUNE_BATCH_SIZE", default=5000)  # real time rows removed per DELETE
+RT_PRUNE_BATCH_PAUSE = env.float("RT_PRUNE_BATCH_PAUSE", default=0.1)  # seconds between prune batches
+ROLLUP_MINUTE_RETENTION_DAYS = env.int("ROLLUP_MINUTE_RETENTION_DAYS", default=7)  # 30 minute and daily rollups are kept
+RT_ARCHIVE_ENABLED = env.bool("RT_ARCHIVE_ENABLED", default=False)  # archive real time data before pruning
+RT_ARCHIVE_DIR = env.str("RT_ARCHIVE_DIR", default=str(BASE_DIR / "archive"))  # per meter/day column files
+RT_SNAPSHOT_TIMEOUT = env.int("RT_SNAPSHOT_TIMEOUT", default=60)  # seconds a real time snapshot is served without a new sweep
+RT_STREAM_POLL_INTERVAL = env.float("RT_STREAM_POLL_INTERVAL", default=1.0)  # seconds between snapshot checks per server process
+RT_STREAM_QUEUE_SIZE = env.int("RT_STREAM_QUEUE_SIZE", default=16)  # pending events per client before it is resynced
+RT_STREAM_KEEPALIVE = env.float("RT_STREAM_KEEPALIVE", default=15.0)  # seconds between keepalive comments
+EXPORT_CHUNK_SIZE = env.int("EXPORT_CHUNK_SIZE", default=2000)  # rows per query and per written block in history exports
+
+# Forecasting configurations
+FORECAST_MODELS_WARM_UP = env.bool("FORECAST_MODELS_WARM_UP", default=False)  # load forecasting models at startup instead of on first request
+FORECAST_ENSEMBLE_WORKERS = env.int("FORECAST_ENSEMBLE_WORKERS", default=4)  # threads evaluating ensemble members at once per process
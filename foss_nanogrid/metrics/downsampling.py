@@ -0,0 +1,62 @@
+import numpy as np
+
+"""
+Server-side downsampling of time series for charts. Both methods take timestamps as
+epoch seconds (sorted) and reduce a series to at most n points:
+- bucket_average: splits [start, end) into n equal time buckets and averages every column
+  (and the timestamps) of the rows in each bucket; empty buckets are dropped.
+- lttb_indices: Largest-Triangle-Three-Buckets; keeps the rows that best preserve the
+  visual shape of one column, so peaks survive. Other columns are taken at those rows.
+NaN values are ignored by the averages; LTTB expects finite values.
+"""
+
+
+# Average timestamps and columns per time bucket; returns (timestamps, {name: values})
+def bucket_average(timestamps, columns: dict, n: int, start: float, end: float):
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    edges = np.linspace(start, end, n + 1)
+    bucket = np.clip(np.searchsorted(edges, timestamps, side="right") - 1, 0, n - 1)
+    counts = np.bincount(bucket, minlength=n)
+    filled = counts > 0
+
+    timestamp_sums = np.bincount(bucket, weights=timestamps, minlength=n)
+    out_timestamps = (timestamp_sums / np.maximum(counts, 1))[filled]
+    out = {}
+    for name, values in columns.items():
+        values = np.asarray(values, dtype=np.float64)
+        valid = ~np.isnan(values)
+        sums = np.bincount(bucket[valid], weights=values[valid], minlength=n)
+        valid_counts = np.bincount(bucket[valid], minlength=n)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[name] = (sums / valid_counts)[filled]
+    return out_timestamps, out
+
+
+# Indices of the n points kept by Largest-Triangle-Three-Buckets on (x, y)
+def lttb_indices(x, y, n: int) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    length = len(x)
+    if n >= length:
+        return np.arange(length)
+    if n < 3:
+        return np.array([0, length - 1][:n], dtype=np.int64)
+
+    # first and last points are always kept; the rest is split into n - 2 buckets
+    edges = np.linspace(1, length - 1, n - 1).astype(np.int64)
+    kept = np.empty(n, dtype=np.int64)
+    kept[0], kept[-1] = 0, length - 1
+    previous = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # average of the next bucket (the last point for the final bucket)
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < n - 1 else length
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        area = np.abs(
+            (x[previous] - avg_x) * (y[lo:hi] - y[previous])
+            - (x[previous] - x[lo:hi]) * (avg_y - y[previous])
+        )
+        previous = lo + int(np.argmax(area))
+        kept[i + 1] = previous
+    return kept
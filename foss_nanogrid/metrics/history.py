@@ -0,0 +1,95 @@
+import base64
+import datetime
+
+import numpy as np
+import pytz
+
+from data_collection.export import EXPORT_FIELDS, iter_rows, rows_after
+from data_collection.models import ThirtyMinAvg
+from metrics.downsampling import bucket_average, lttb_indices
+
+"""
+Range queries over ThirtyMinAvg history for metrics.thirty_min_history. Rows are read in
+(smart_meter, timestamp, id) order with keyset pagination, which walks the composite index
+instead of paying an OFFSET scan, and only the requested fields are fetched (values_list).
+Without max_points rows are returned in pages with an opaque cursor for the next page.
+With max_points every meter's series is reduced on the server to at most that many
+points (bucket averages, or LTTB on the first requested field).
+"""
+
+# Numeric ThirtyMinAvg fields that can be requested
+HISTORY_FIELDS = EXPORT_FIELDS["thirty_min"]
+DEFAULT_FIELDS = ["active", "reactive", "apparent", "power_factor", "freq"]
+
+KEYSET_CHUNK_SIZE = 2000  # rows per query while reading a whole series
+DEFAULT_PAGE_SIZE = 5000
+MAX_PAGE_SIZE = 20000
+
+DOWNSAMPLING_METHODS = ["average", "lttb"]
+
+
+def encode_cursor(sm_id, timestamp: datetime.datetime, pk) -> str:
+    raw = f"{sm_id}|{timestamp.astimezone(pytz.utc).isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+# (smart meter id, timestamp, row id) of a cursor; raises ValueError if it is malformed
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        sm_id, timestamp, pk = raw.split("|")
+        return int(sm_id), datetime.datetime.fromisoformat(timestamp), int(pk)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+# One page of rows and the cursor of the next page (None on the last page)
+def read_page(sm_ids, start, end, fields, page_size=DEFAULT_PAGE_SIZE, cursor=None):
+    after = decode_cursor(cursor) if cursor else None
+    rows = rows_after(ThirtyMinAvg, sm_ids, start, end, fields, after, page_size + 1)
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(*rows[-1][:3])
+    return rows, next_cursor
+
+
+# Rows of one meter reduced to at most max_points: (timestamps, {field: values}, downsampled)
+def read_downsampled(sm_id, start, end, fields, max_points, method="average"):
+    rows = list(
+        iter_rows(ThirtyMinAvg, [sm_id], start, end, fields, KEYSET_CHUNK_SIZE)
+    )
+    timestamps = [row[1] for row in rows]
+    columns = {
+        field: np.array(
+            [np.nan if row[i] is None else row[i] for row in rows], dtype=np.float64
+        )
+        for i, field in enumerate(fields, start=3)
+    }
+    if len(rows) <= max_points:
+        return timestamps, columns, False
+
+    epochs = np.array([timestamp.timestamp() for timestamp in timestamps])
+    if method == "lttb":
+        # LTTB needs finite values; rows missing the shaped field are left out
+        finite = np.flatnonzero(~np.isnan(columns[fields[0]]))
+        kept = finite[lttb_indices(epochs[finite], columns[fields[0]][finite], max_points)]
+        return (
+            [timestamps[i] for i in kept],
+            {field: values[kept] for field, values in columns.items()},
+            True,
+        )
+
+    averaged_epochs, averaged = bucket_average(
+        epochs, columns, max_points, start.timestamp(), end.timestamp()
+    )
+    return (
+        [datetime.datetime.fromtimestamp(epoch, pytz.utc) for epoch in averaged_epochs],
+        averaged,
+        True,
+    )
+
+
+# JSON safe list of a float column (NaN -> None)
+def to_json_values(values) -> list:
+    return [None if value != value else value for value in np.asarray(values).tolist()]
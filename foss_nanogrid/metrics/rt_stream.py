@@ -0,0 +1,117 @@
+import asyncio
+import json
+import logging
+
+from django.conf import settings
+
+from data_collection.rt_snapshot import aget_rt_snapshot
+
+log = logging.getLogger(__name__)
+
+"""
+Fan-out of real time meter updates to Server-Sent Events clients (metrics.rt_stream).
+One broadcaster per server process polls the poller's cache snapshot (see
+data_collection.rt_snapshot) and pushes only the meters that changed to every connected
+dashboard, so the cost per sweep is one cache read regardless of the number of clients.
+Each client has a bounded queue; a client that falls behind has its pending updates
+replaced by a single full snapshot instead of buffering without limit.
+Requires an ASGI server (see foss_nanogrid.asgi); the broadcaster runs on its event loop.
+"""
+
+
+class RTSubscriber:
+    def __init__(self, max_queue: int):
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0  # updates replaced by a snapshot because the client lagged
+
+    # Queue an event; a full queue is replaced by the latest complete snapshot
+    def push(self, event: str, meters: list, snapshot: list):
+        try:
+            self.queue.put_nowait((event, meters))
+            return
+        except asyncio.QueueFull:
+            pass
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(("snapshot", snapshot))
+
+
+class RTBroadcaster:
+    def __init__(self, poll_interval: float, max_queue: int):
+        self.poll_interval = poll_interval
+        self.max_queue = max_queue
+        self.subscribers = set()
+        self.snapshot = None  # last published {smart meter pk: dashboard dict}
+        self._task = None
+
+    # Register a client; it starts with the current snapshot
+    def subscribe(self) -> RTSubscriber:
+        subscriber = RTSubscriber(self.max_queue)
+        if self.snapshot is not None:
+            full = list(self.snapshot.values())
+            subscriber.push("snapshot", full, full)
+        self.subscribers.add(subscriber)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return subscriber
+
+    def unsubscribe(self, subscriber: RTSubscriber):
+        self.subscribers.discard(subscriber)
+        if not self.subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    # Send the meters that changed since the last publish to every subscriber
+    def publish(self, snapshot: dict):
+        previous = self.snapshot or {}
+        changed = [
+            entry for pk, entry in snapshot.items() if previous.get(pk) != entry
+        ]
+        self.snapshot = snapshot
+        if not changed:
+            return
+        full = list(snapshot.values())
+        event = "snapshot" if not previous else "update"
+        for subscriber in self.subscribers:
+            subscriber.push(event, full if event == "snapshot" else changed, full)
+
+    async def _run(self):
+        while self.subscribers:
+            try:
+                snapshot = await aget_rt_snapshot()
+                if snapshot is not None:
+                    self.publish(snapshot)
+            except Exception as e:
+                log.error(f"Failed to read real time snapshot: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+
+_broadcaster = None
+
+
+# Process-wide broadcaster, created on first use
+def get_broadcaster() -> RTBroadcaster:
+    global _broadcaster
+    if _broadcaster is None:
+        _broadcaster = RTBroadcaster(
+            poll_interval=settings.RT_STREAM_POLL_INTERVAL,
+            max_queue=settings.RT_STREAM_QUEUE_SIZE,
+        )
+    return _broadcaster
+
+
+# Server-Sent Events for one client; comment lines keep idle connections open
+async def event_stream(subscriber: RTSubscriber, broadcaster: RTBroadcaster):
+    try:
+        while True:
+            try:
+                event, meters = await asyncio.wait_for(
+                    subscriber.queue.get(), timeout=settings.RT_STREAM_KEEPALIVE
+                )
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: {event}\ndata: {json.dumps(meters, default=str)}\n\n"
+    finally:
+        broadcaster.unsubscribe(subscriber)
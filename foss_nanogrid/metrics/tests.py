@@ -1,3 +1,336 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from decimal import Decimal
+from rest_framework.renderers import JSONRenderer
+import datetime
+import msgpack
+import pandas as pd
+
+from data_collection.models import RealTimeMeter, SmartMeter, ThirtyMinAvg
+from data_collection.poll_stats import record_poll_stats
+from data_collection.rt_snapshot import update_rt_snapshot
+from data_collection.tasks import _store_sweep
+from foss_nanogrid.renderers import FastJSONRenderer, to_columnar
+from metrics.rt_stream import RTBroadcaster, event_stream
+
 
 # Create your tests here.
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        for i in range(3):
+            SmartMeter.objects.create(
+                ip_address=f"172.20.49.{i}",
+                field_name=f"EC_SM{i}",
+                distribution_board="Energy Centre",
+                latitude=35.146506,
+                longitude=33.415653,
+                feeder="Incomer",
+                serial_no=f"ME-{i}",
+                modbus_port=502,
+                mac_address="6078089165",
+                username="admin",
+                password="0",
+            )
+        self.smart_meters = list(SmartMeter.objects.order_by("pk"))
+        RealTimeMeter.objects.create(
+            smart_meter=self.smart_meters[2],
+            timestamp=datetime.datetime.now(datetime.timezone.utc),
+            active=7,
+            reactive=7,
+            apparent=7,
+            power_factor=7,
+            freq=7,
+        )
+
+    def test_rt_all_meters_from_snapshot(self):
+        # without a snapshot the endpoint reads the database
+        response = self.client.get(reverse("rt_all_meters"))
+        self.assertEqual([m["active"] for m in response.json()], [0, 0, 7])
+
+        results = [
+            (self.smart_meters[0], [1.0, 2.0, 3.0, 0.9, 50.0]),
+            (self.smart_meters[1], None),
+        ]
+        update_rt_snapshot(self.smart_meters, _store_sweep(results))
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("rt_all_meters"))
+        self.assertEqual(len(ctx.captured_queries), 0)
+        meters = response.json()
+        self.assertEqual([m["name"] for m in meters], ["EC_SM0", "EC_SM1", "EC_SM2"])
+        self.assertEqual(
+            (meters[0]["recievingInfo"], meters[0]["powerFactor"]), (True, 0.9)
+        )
+        self.assertEqual([m["active"] for m in meters[1:]], [0, 7])
+        self.assertFalse(any(m["recievingInfo"] for m in meters[1:]))
+
+        # meters missing from a later sweep keep their last values
+        update_rt_snapshot(self.smart_meters, [])
+        meters = self.client.get(reverse("rt_all_meters")).json()
+        self.assertEqual((meters[0]["active"], meters[0]["recievingInfo"]), (1.0, False))
+
+    def test_devices_connectivity(self):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        answered = [RealTimeMeter(smart_meter=self.smart_meters[0], timestamp=now)]
+        earlier = now - datetime.timedelta(hours=3)
+        # EC_SM2 has not been polled yet (e.g. just added)
+        record_poll_stats(self.smart_meters[:2], answered, now=earlier)
+        record_poll_stats(self.smart_meters[:2], answered, now=now)
+        record_poll_stats(self.smart_meters[:2], [], now=now)
+
+        with CaptureQueriesContext(connection) as ctx:
+            devices = self.client.get(reverse("devices")).json()
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertEqual(
+            devices[0]["connectivity"], {"1h": 50.0, "24h": 66.7, "7d": 66.7}
+        )
+        self.assertEqual(devices[0]["connectivityPercentage"], 66.7)
+        self.assertEqual(devices[1]["connectivityPercentage"], 0.0)
+        # connectivityPercentage stays a number without poll stats
+        self.assertEqual(devices[2]["connectivityPercentage"], 0.0)
+        self.assertEqual(
+            devices[2]["connectivity"], {"1h": None, "24h": None, "7d": None}
+        )
+
+    def test_columnar_layout(self):
+        response = self.client.get(reverse("rt_all_meters"), {"format": "columnar"})
+        self.assertEqual(
+            response["Content-Type"], "application/vnd.nanogrid.columnar+json"
+        )
+        columns = response.json()
+        self.assertEqual(columns["name"], ["EC_SM0", "EC_SM1", "EC_SM2"])
+        self.assertEqual(columns["active"], [0, 0, 7])
+
+        response = self.client.get(
+            reverse("devices"), HTTP_ACCEPT="application/vnd.nanogrid.columnar+json"
+        )
+        self.assertEqual(response.json()["ipAddress"][0], "172.20.49.0")
+
+    def test_thirty_min_history_paging(self):
+        start = datetime.datetime(2024, 6, 13, tzinfo=datetime.timezone.utc)
+        ThirtyMinAvg.objects.bulk_create(
+            ThirtyMinAvg(
+                smart_meter=sm,
+                timestamp=start + datetime.timedelta(minutes=30 * i),
+                active=i,
+                freq=50,
+            )
+            for sm in self.smart_meters[:2]
+            for i in range(5)
+        )
+        params = {
+            "start": "2024-06-13",
+            "end": "2024-06-14",
+            "fields": "active,freq",
+            "page_size": 3,
+        }
+        rows = []
+        while True:
+            page = self.client.get(reverse("thirty_min_history"), params).json()
+            rows += page["values"]
+            if page["next"] is None:
+                break
+            params["cursor"] = page["next"]
+        self.assertEqual([r["meter"] for r in rows], ["EC_SM0"] * 5 + ["EC_SM1"] * 5)
+        self.assertEqual([r["active"] for r in rows], list(range(5)) * 2)
+        self.assertEqual(set(rows[0]), {"meter", "timestamp", "active", "freq"})
+
+        params = {"start": "2024-06-13", "end": "2024-06-14", "meters": "EC_SM1"}
+        page = self.client.get(reverse("thirty_min_history"), params).json()
+        self.assertEqual({r["meter"] for r in page["values"]}, {"EC_SM1"})
+
+        for invalid in [
+            {"start": "2024-06-13"},
+            {"start": "2024-06-13", "end": "2024-06-14", "fields": "smart_meter"},
+            {"start": "2024-06-13", "end": "2024-06-14", "meters": "EC_SM9"},
+            {"start": "2024-06-13", "end": "2024-06-14", "cursor": "x"},
+        ]:
+            response = self.client.get(reverse("thirty_min_history"), invalid)
+            self.assertEqual(response.status_code, 400)
+
+        for invalid in [
+            {"start": "2024-06-14", "end": "2024-06-13"},
+            {"start": "yesterday", "end": "2024-06-13"},
+            {"max_points": 1},
+            {"max_points": "many"},
+            {"downsample": "median", "max_points": 10},
+            {"page_size": 0},
+        ]:
+            params = {"start": "2024-06-13", "end": "2024-06-14", **invalid}
+            response = self.client.get(reverse("thirty_min_history"), params)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("error", response.json())
+
+    def test_thirty_min_history_paging_same_timestamp(self):
+        # rows sharing (meter, timestamp) are not lost at a page boundary
+        start = datetime.datetime(2024, 6, 13, tzinfo=datetime.timezone.utc)
+        ThirtyMinAvg.objects.bulk_create(
+            ThirtyMinAvg(smart_meter=self.smart_meters[0], timestamp=start, active=i)
+            for i in range(4)
+        )
+        params = {"start": "2024-06-13", "end": "2024-06-14", "page_size": 2}
+        rows = []
+        while True:
+            page = self.client.get(reverse("thirty_min_history"), params).json()
+            rows += page["values"]
+            if page["next"] is None:
+                break
+            params["cursor"] = page["next"]
+        self.assertEqual([r["active"] for r in rows], [0, 1, 2, 3])
+
+    def test_export_history(self):
+        start = datetime.datetime(2024, 6, 13, tzinfo=datetime.timezone.utc)
+        ThirtyMinAvg.objects.bulk_create(
+            ThirtyMinAvg(
+                smart_meter=sm,
+                timestamp=start + datetime.timedelta(minutes=30 * i),
+                active=i,
+            )
+            for sm in self.smart_meters[:2]
+            for i in range(3)
+        )
+        params = {"start": "2024-06-13", "end": "2024-06-14", "fields": "active,freq"}
+        response = self.client.get(reverse("export_history"), params)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(
+            lines[:3],
+            [
+                "meter,timestamp,active,freq",
+                "EC_SM0,2024-06-13T00:00:00+00:00,0.0,",
+                "EC_SM0,2024-06-13T00:30:00+00:00,1.0,",
+            ],
+        )
+        self.assertEqual(len(lines), 7)
+
+        # fields are checked against the source
+        params.update(source="raw", fields="data_points")
+        response = self.client.get(reverse("export_history"), params)
+        self.assertEqual(response.status_code, 400)
+        for invalid in [
+            {"start": "2024-06-14", "end": "2024-06-13"},
+            {"start": "yesterday"},
+            {"source": "minute"},
+        ]:
+            params = {"start": "2024-06-13", "end": "2024-06-14", **invalid}
+            response = self.client.get(reverse("export_history"), params)
+            self.assertEqual(response.status_code, 400)
+
+    def test_thirty_min_history_downsampling(self):
+        start = datetime.datetime(2024, 6, 13, tzinfo=datetime.timezone.utc)
+        ThirtyMinAvg.objects.bulk_create(
+            ThirtyMinAvg(
+                smart_meter=self.smart_meters[0],
+                timestamp=start + datetime.timedelta(minutes=30 * i),
+                active=100 if i == 25 else i % 2,
+            )
+            for i in range(48)
+        )
+        params = {
+            "start": "2024-06-13",
+            "end": "2024-06-14",
+            "meters": "EC_SM0",
+            "fields": "active,reactive",
+            "max_points": 8,
+        }
+        page = self.client.get(reverse("thirty_min_history"), params).json()
+        self.assertEqual(page["downsampling"], "average")
+        self.assertEqual(len(page["values"]), 8)
+        self.assertEqual(page["values"][0]["active"], 0.5)
+        self.assertIsNone(page["values"][0]["reactive"])
+
+        # LTTB keeps the spike that averaging flattens
+        params["downsample"] = "lttb"
+        page = self.client.get(reverse("thirty_min_history"), params).json()
+        self.assertEqual(len(page["values"]), 8)
+        self.assertIn(100, [r["active"] for r in page["values"]])
+
+    def test_msgpack_layout(self):
+        response = self.client.get(reverse("rt_all_meters"), {"format": "msgpack"})
+        self.assertEqual(response["Content-Type"], "application/x-msgpack")
+        self.assertEqual(msgpack.unpackb(response.content)["active"], [0, 0, 7])
+        response = self.client.get(
+            reverse("rt_all_meters"), HTTP_ACCEPT="application/x-msgpack"
+        )
+        self.assertEqual(msgpack.unpackb(response.content)["active"], [0, 0, 7])
+
+
+class ColumnarTestCase(SimpleTestCase):
+    def test_to_columnar(self):
+        forecast = {
+            "unit": "MW",
+            "values": [
+                {"Timestamp": "2024-06-13T11:00:00Z", "MW": 1.0},
+                {"Timestamp": "2024-06-13T11:30:00Z", "MW": 2.0, "State of Charge": 3},
+            ],
+        }
+        self.assertEqual(
+            to_columnar(forecast),
+            {
+                "unit": "MW",
+                "values": {
+                    "Timestamp": ["2024-06-13T11:00:00Z", "2024-06-13T11:30:00Z"],
+                    "MW": [1.0, 2.0],
+                    "State of Charge": [None, 3],
+                },
+            },
+        )
+        self.assertEqual(to_columnar({"error": "x"}), {"error": "x"})
+
+    def test_fast_json_renderer(self):
+        data = {
+            "unit": "MW \u2028 \u00b0C",
+            "date_run": pd.Timestamp("2024-06-13 09:00:00.5", tz="UTC"),
+            "capacity": Decimal("1.25"),
+            "values": [
+                {"Timestamp": pd.Timestamp("2024-06-13 11:00", tz="Asia/Nicosia"), "MW": 0.5},
+                {"Timestamp": datetime.datetime(2024, 6, 13, 8, 30), "MW": None},
+            ],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class RTStreamTestCase(SimpleTestCase):
+    async def test_broadcast_changes_and_backpressure(self):
+        broadcaster = RTBroadcaster(poll_interval=3600, max_queue=2)
+        broadcaster.publish(
+            {1: {"name": "a", "active": 1}, 2: {"name": "b", "active": 2}}
+        )
+        subscriber = broadcaster.subscribe()
+        event, meters = subscriber.queue.get_nowait()
+        self.assertEqual((event, len(meters)), ("snapshot", 2))
+
+        # only changed meters are sent
+        broadcaster.publish(
+            {1: {"name": "a", "active": 1}, 2: {"name": "b", "active": 3}}
+        )
+        self.assertEqual(
+            subscriber.queue.get_nowait(), ("update", [{"name": "b", "active": 3}])
+        )
+
+        # a lagging client gets one snapshot instead of an unbounded backlog
+        for active in range(4, 7):
+            broadcaster.publish({1: {"name": "a", "active": active}})
+        self.assertEqual(subscriber.queue.qsize(), 1)
+        self.assertEqual(
+            subscriber.queue.get_nowait(), ("snapshot", [{"name": "a", "active": 6}])
+        )
+
+        stream = event_stream(subscriber, broadcaster)
+        broadcaster.publish({1: {"name": "a", "active": 8}})
+        self.assertEqual(
+            await stream.__anext__(),
+            'event: update\ndata: [{"name": "a", "active": 8}]\n\n',
+        )
+        await stream.aclose()
+        self.assertFalse(broadcaster.subscribers)
@@ -4,4 +4,7 @@ from . import views
 urlpatterns = [
     path("devices", views.devices, name="devices"),
     path("rt-all-meters/", views.rt_all_meters, name="rt_all_meters"),
+    path("rt-stream/", views.rt_stream, name="rt_stream"),
+    path("thirty-min-history/", views.thirty_min_history, name="thirty_min_history"),
+    path("export/", views.export_history, name="export_history"),
 ]
@@ -1,25 +1,48 @@
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render
-from rest_framework.decorators import api_view
+from django.views.decorators.http import require_GET
+from rest_framework.decorators import api_view, renderer_classes
 from rest_framework.response import Response
 from rest_framework import status
 
 import logging
 
+from data_collection.export import EXPORT_FIELDS, export_rows, iter_csv, parse_time
 from data_collection.models import SmartMeter, RealTimeMeter
+from data_collection.poll_stats import CONNECTIVITY_WINDOWS, connectivity
+from data_collection.rt_snapshot import get_rt_snapshot, rt_data_dict_from_db
+from foss_nanogrid.renderers import COLUMNAR_RENDERERS
+from metrics.history import (
+    DEFAULT_FIELDS,
+    DEFAULT_PAGE_SIZE,
+    DOWNSAMPLING_METHODS,
+    HISTORY_FIELDS,
+    MAX_PAGE_SIZE,
+    read_downsampled,
+    read_page,
+    to_json_values,
+)
+from metrics.rt_stream import event_stream, get_broadcaster
 log = logging.getLogger(__name__)
 
 # Overview of metrics
 @api_view(["GET"])
+@renderer_classes(COLUMNAR_RENDERERS)
 def devices(request):
     if not request.method == "GET":
         log.info("Invalid info/ request. {request.method} instead of GET")
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
     
     smart_meters = SmartMeter.objects.all()
+    # percentage of successful polls per window from the poll counters (one query)
+    stats = connectivity()
+    no_stats = dict.fromkeys(CONNECTIVITY_WINDOWS)
     sm_dicts = list(map(lambda sm: {
         "name": sm.field_name,
         "ipAddress": sm.ip_address,
-        "connectivityPercentage": 50,    # Still need to implement functionality on this
+        # always a number for existing clients: 0.0 without polls in the last 24 hours
+        "connectivityPercentage": stats.get(sm.pk, no_stats)["24h"] or 0.0,
+        "connectivity": stats.get(sm.pk, no_stats),
         "latitude": sm.latitude,
         "longitude": sm.longitude,
     }, smart_meters))
@@ -28,36 +51,168 @@ def devices(request):
 
     
 def _create_rt_data_dict(sm):
-    try:
-        last_data_point = RealTimeMeter.objects.filter(smart_meter=sm).latest('timestamp')
-        return {
-            "name": sm.field_name,
-            "recievingInfo": sm.recieving_info,
-            "active": last_data_point.active,
-            "reactive": last_data_point.reactive,
-            "apparent": last_data_point.apparent,
-            "frequency": last_data_point.freq,
-            "powerFactor": last_data_point.power_factor,
-        }
-    except RealTimeMeter.DoesNotExist:
-        return {
-            "name": sm.field_name,
-            "recievingInfo": False,
-            "active": 0,
-            "reactive": 0,
-            "apparent": 0,
-            "frequency": 0,
-            "powerFactor": 0,
-        }    
+    return rt_data_dict_from_db(sm)
 
 
+# Served from the poller's snapshot (one cache read); falls back to one query per meter
 @api_view(["GET"])
+@renderer_classes(COLUMNAR_RENDERERS)
 def rt_all_meters(request):
     if not request.method == "GET":
         log.info("Invalid info/ request. {request.method} instead of GET")
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
     
+    snapshot = get_rt_snapshot()
+    if snapshot is not None:
+        return Response(list(snapshot.values()), status=status.HTTP_200_OK)
+
     smart_meters = SmartMeter.objects.all()
     rt_data_dicts = list(map(_create_rt_data_dict, smart_meters))
 
-    return Response(rt_data_dicts, status=status.HTTP_200_OK)
\ No newline at end of file
+    return Response(rt_data_dicts, status=status.HTTP_200_OK)
+
+
+# Server-Sent Events of real time meter data: a full "snapshot" event, then "update"
+# events with only the meters that changed after each sweep (needs an ASGI server)
+@require_GET
+async def rt_stream(request):
+    broadcaster = get_broadcaster()
+    subscriber = broadcaster.subscribe()
+    response = StreamingHttpResponse(
+        event_stream(subscriber, broadcaster), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # disable proxy buffering (nginx)
+    return response
+
+
+# Smart meters named in the comma separated meters param (all if missing), ordered by pk;
+# None if a name is unknown
+def _selected_meters(params):
+    smart_meters = SmartMeter.objects.order_by("pk")
+    if "meters" in params:
+        names = params["meters"].split(",")
+        smart_meters = smart_meters.filter(field_name__in=names)
+        if len(smart_meters) < len(set(names)):
+            return None
+    return list(smart_meters)
+
+
+# 400 response to an invalid thirty-min-history/ request, with the reason in the body
+def _invalid_history_request(message):
+    log.info(f"Invalid thirty-min-history/ request: {message}")
+    return Response({"error": message}, status=status.HTTP_400_BAD_REQUEST)
+
+
+# ThirtyMinAvg history. Required params start, end (ISO). Optional params meters (comma
+# separated names, default all), fields (comma separated), max_points and downsample
+# (average or lttb) to reduce each meter's series, page_size and cursor for paging
+@api_view(["GET"])
+@renderer_classes(COLUMNAR_RENDERERS)
+def thirty_min_history(request):
+    params = request.query_params
+    if not "start" in params or not "end" in params:
+        log.info("Invalid thirty-min-history/ request. Missing start or end query params")
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+    try:
+        start, end = parse_time(params["start"]), parse_time(params["end"])
+    except ValueError as e:
+        return _invalid_history_request(f"Invalid start or end: {e}")
+    if not start < end:
+        return _invalid_history_request("start must be before end")
+    fields = params["fields"].split(",") if "fields" in params else DEFAULT_FIELDS
+    if not set(fields) <= set(HISTORY_FIELDS):
+        return _invalid_history_request(f"fields must be in {HISTORY_FIELDS}")
+    try:
+        max_points = int(params["max_points"]) if "max_points" in params else None
+        page_size = int(params.get("page_size", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return _invalid_history_request("max_points and page_size must be integers")
+    if max_points is not None and max_points < 2:
+        return _invalid_history_request("max_points must be at least 2")
+    method = params.get("downsample", "average")
+    if method not in DOWNSAMPLING_METHODS:
+        return _invalid_history_request(f"downsample must be in {DOWNSAMPLING_METHODS}")
+    if page_size <= 0:
+        return _invalid_history_request("page_size must be positive")
+    page_size = min(page_size, MAX_PAGE_SIZE)
+
+    smart_meters = _selected_meters(params)
+    if smart_meters is None:
+        log.info("Invalid thirty-min-history/ request. Smart meter not found")
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+    names = {sm.pk: sm.field_name for sm in smart_meters}
+
+    values = []
+    next_cursor = None
+    if max_points is None:
+        try:
+            rows, next_cursor = read_page(
+                list(names), start, end, fields, page_size, params.get("cursor")
+            )
+        except ValueError as e:
+            return _invalid_history_request(str(e))
+        for sm_id, timestamp, _, *row in rows:
+            values.append(
+                {"meter": names[sm_id], "timestamp": timestamp, **dict(zip(fields, row))}
+            )
+    else:
+        for sm_id, name in names.items():
+            timestamps, columns, _ = read_downsampled(
+                sm_id, start, end, fields, max_points, method
+            )
+            columns = {field: to_json_values(columns[field]) for field in fields}
+            for i, timestamp in enumerate(timestamps):
+                row = {field: columns[field][i] for field in fields}
+                values.append({"meter": name, "timestamp": timestamp, **row})
+
+    history = {
+        "start": start,
+        "end": end,
+        "fields": fields,
+        "downsampling": method if max_points is not None else None,
+        "max_points": max_points,
+        "values": values,
+        "next": next_cursor,
+    }
+    return Response(history, status=status.HTTP_200_OK)
+
+
+# 400 response to an invalid export/ request, with the reason as plain text
+def _invalid_export_request(message):
+    log.info(f"Invalid export/ request: {message}")
+    return HttpResponse(message, status=400, content_type="text/plain")
+
+
+# Streamed CSV export of meter history. Required params start, end (ISO). Optional params
+# source (thirty_min, default, or raw), meters (comma separated names, default all) and
+# fields (comma separated, default all fields of the source)
+@require_GET
+def export_history(request):
+    params = request.GET
+    if not "start" in params or not "end" in params:
+        log.info("Invalid export/ request. Missing start or end query params")
+        return HttpResponse(status=400)
+    try:
+        start, end = parse_time(params["start"]), parse_time(params["end"])
+    except ValueError as e:
+        return _invalid_export_request(f"Invalid start or end: {e}")
+    if not start < end:
+        return _invalid_export_request("start must be before end")
+    source = params.get("source", "thirty_min")
+    if source not in EXPORT_FIELDS:
+        return _invalid_export_request(f"source must be in {list(EXPORT_FIELDS)}")
+    fields = params["fields"].split(",") if "fields" in params else EXPORT_FIELDS[source]
+    if not set(fields) <= set(EXPORT_FIELDS[source]):
+        return _invalid_export_request(f"fields must be in {EXPORT_FIELDS[source]}")
+
+    smart_meters = _selected_meters(params)
+    if smart_meters is None:
+        log.info("Invalid export/ request. Smart meter not found")
+        return HttpResponse(status=400)
+
+    rows = export_rows(source, smart_meters, start, end, fields)
+    response = StreamingHttpResponse(iter_csv(rows, fields), content_type="text/csv")
+    filename = f"{source}_{start:%Y%m%d}_{end:%Y%m%d}.csv"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response